@@ -9,3 +9,31 @@ BACKTEST_PARAMS = {
     'cost_sell': 0.0015,     # 卖出成本 0.15%（含印花税）
     'cache_expire_days': 7,
 }
+
+# 参数扫描网格（run_param_sweep.py），参数名取自 BACKTEST_PARAMS / STOCK_FILTER_CONFIG
+SWEEP_GRID = {
+    'max_stocks': [5, 6],
+    'hold_days': [5, 7, 10],
+    'stop_loss_pct': [-0.05, -0.07, -0.10],
+}
+
+# 滚动窗口回测（run_walk_forward.py）：训练窗口上按 grid 选参，测试窗口样本外回测
+WALK_FORWARD = {
+    'start_date': '2024-01-01',
+    'end_date': '2026-05-25',
+    'train_months': 6,
+    'test_months': 3,
+    'step_months': 3,
+    'objective': 'total_return',
+    'grid': {
+        'hold_days': [5, 7, 10],
+        'stop_loss_pct': [-0.05, -0.07],
+    },
+}
+
+# 回测结果块自助重采样（稳健性置信区间）
+BOOTSTRAP_PARAMS = {
+    'n_paths': 10000,
+    'block_size': 10,   # 块长度（交易日），保留持仓期内的收益相关性
+    'seed': 42,
+}
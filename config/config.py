@@ -30,6 +30,39 @@ DATA_CONFIG = {
     'cache_dir': './data_cache'
 }
 
+# 行情接口并发控制（AIMD：健康时逐步增加并发，超时/非200时减半）
+FETCH_CONCURRENCY = {
+    'initial': 8,            # 初始并发请求数
+    'min_limit': 1,
+    'max_limit': 64,         # 并发上限（同时也是连接池/线程池大小）
+    'latency_target': 3.0,   # 请求耗时超过该值(秒)时不再增加并发
+    'backoff': 0.5,          # 失败时并发缩小比例
+}
+
+# 按主机的请求速率（令牌桶：rate 每秒请求数，burst 允许的突发请求数），进程内所有HTTP调用共用
+RATE_LIMITS = {
+    'qt.gtimg.cn': {'rate': 20, 'burst': 40},              # 腾讯行情
+    'web.ifzq.gtimg.cn': {'rate': 20, 'burst': 40},        # 腾讯K线
+    'datacenter-web.eastmoney.com': {'rate': 0.5, 'burst': 1},  # 东财业绩报表（akshare）
+    'default': {'rate': 5, 'burst': 10},
+}
+
+# 同步HTTP连接池（keep-alive复用连接），pool_maxsize 不小于该主机的最大并发
+HTTP_POOLS = {
+    'qt.gtimg.cn': {'pool_maxsize': 64},
+    'web.ifzq.gtimg.cn': {'pool_maxsize': 64},
+    'default': {'pool_maxsize': 10},
+}
+
+# 连接池的传输层重试（连接失败/复用连接被关闭），非200由调用方重试
+HTTP_RETRY = {
+    'total': 2,
+    'connect': 2,
+    'read': 1,
+    'status': 0,
+    'backoff_factor': 0.2,
+}
+
 # 调度配置
 SCHEDULE_CONFIG = {
     'analysis_time': '16:00',    # 盘后分析时间
@@ -0,0 +1,149 @@
+"""
+评分分档表
+
+每个分项由若干"分档阶梯"组成，一个阶梯对应原来一组 if/elif：
+    field:   评分字段（stock_data中的键，或 src/analysis/scoring.py 中的派生字段）
+    closed:  区间闭合方式，同 pandas.Interval：'left' [lo, hi)，'right' (lo, hi]，
+             'both' [lo, hi]，'neither' (lo, hi)；单条规则可用第4项覆盖
+    nonzero: 字段为0时不得分（对应 `x and ...` 写法）
+    round:   先按 round(x, n) 取整再分档
+    bins:    [(lo, hi, 分数)]，lo/hi 为 None 表示不设限，按顺序首个命中得分
+
+分项得分为各阶梯得分之和，总分为各分项之和。
+penalties 为跨字段规则：field > above 且 short_field > field * ratio 时，该分项得分减半（整除）。
+"""
+
+# ===== StockFilter：基础强势评分（满分100）=====
+STRENGTH_TABLE = {
+    'buckets': {
+        # 技术面 (30分): 动量25 + 换手率5
+        'technical': [
+            {'field': 'momentum_20d', 'closed': 'right',
+             'bins': [(15, None, 25), (10, None, 20), (5, None, 14), (0, None, 8), (-5, None, 3)]},
+            {'field': 'turnover_rate', 'closed': 'left', 'nonzero': True,
+             'bins': [(1, 3, 5), (3, 5, 4), (5, 8, 3), (0.5, 1, 2)]},
+        ],
+        # 估值 (25分): PE10 + PB5 + PR10
+        'valuation': [
+            {'field': 'pe_ratio', 'closed': 'left', 'nonzero': True,
+             'bins': [(0, 10, 10, 'neither'), (10, 20, 7), (20, 30, 4)]},
+            {'field': 'pb_ratio', 'closed': 'left', 'nonzero': True,
+             'bins': [(0, 2, 5, 'neither'), (2, 4, 4), (4, 7, 2)]},
+            {'field': 'pr_ratio', 'closed': 'left', 'nonzero': True, 'round': 3,
+             'bins': [(0, 0.8, 10, 'neither'), (0.8, 1, 7), (1, 1.2, 3)]},
+        ],
+        # 盈利质量 (30分): ROE15 + 利润增长15
+        'profitability': [
+            {'field': 'roe', 'closed': 'right', 'nonzero': True,
+             'bins': [(20, None, 15), (15, None, 12), (10, None, 8), (5, None, 4)]},
+            {'field': 'profit_growth', 'closed': 'right', 'nonzero': True,
+             'bins': [(30, None, 15), (20, None, 12), (10, None, 8), (0, None, 4)]},
+        ],
+        # 安全性 (10分): PB安全边际5 + 低换手率5
+        'safety': [
+            {'field': 'pb_ratio', 'closed': 'left', 'nonzero': True,
+             'bins': [(0, 1.0, 5, 'neither'), (1.0, 1.5, 4), (1.5, 2.5, 2)]},
+            {'field': 'turnover_rate', 'closed': 'left', 'nonzero': True,
+             'bins': [(0, 2, 5, 'neither'), (2, 5, 3), (5, 10, 1)]},
+        ],
+        # 分红 (5分): 股息率
+        'dividend': [
+            {'field': 'dividend_yield', 'closed': 'right', 'nonzero': True,
+             'bins': [(5, None, 5), (3, None, 4), (2, None, 3), (1, None, 2), (0.5, None, 1)]},
+        ],
+    },
+}
+
+# ===== StockFilter：进攻模式在基础分上的加分 =====
+OFFENSIVE_BONUS_TABLE = {
+    'buckets': {
+        'bonus': [
+            {'field': 'momentum_20d', 'closed': 'right',
+             'bins': [(15, None, 12), (10, None, 8), (5, None, 4)]},
+            {'field': 'profit_growth', 'closed': 'right', 'nonzero': True,
+             'bins': [(30, None, 5)]},
+        ],
+    },
+}
+
+# ===== StockFilter：超防守评分 =====
+ULTRA_DEFENSIVE_TABLE = {
+    'buckets': {
+        'low_volatility': [
+            {'field': 'volatility_20d', 'closed': 'left',
+             'bins': [(None, 1.0, 30), (None, 1.5, 25), (None, 2.0, 18), (None, 2.5, 10)]},
+        ],
+        'low_pb': [
+            {'field': 'pb_ratio', 'closed': 'left', 'nonzero': True,
+             'bins': [(0, 0.8, 25, 'neither'), (0.8, 1.2, 20), (1.2, 2.0, 12), (2.0, 3.0, 5)]},
+        ],
+        'high_roe': [
+            {'field': 'roe', 'closed': 'right', 'nonzero': True,
+             'bins': [(15, None, 25), (10, None, 18), (7, None, 10)]},
+        ],
+        'small_drawdown': [
+            {'field': 'max_drawdown_20d', 'closed': 'right',
+             'bins': [(-3, None, 20), (-5, None, 14), (-8, None, 7)]},
+        ],
+        'momentum_bonus': [
+            {'field': 'momentum_20d', 'closed': 'right', 'bins': [(0, 5, 5)]},
+        ],
+    },
+}
+
+STOCK_FILTER_TABLES = {
+    'strength': STRENGTH_TABLE,
+    'offensive_bonus': OFFENSIVE_BONUS_TABLE,
+    'ultra_defensive': ULTRA_DEFENSIVE_TABLE,
+}
+
+# ===== 回测 score_stock_optimized：平衡型评分（满分100）=====
+OPTIMIZED_TABLE = {
+    'buckets': {
+        # 技术面（25分）：动量15 + 量比10
+        'momentum': [
+            {'field': 'momentum_20d', 'closed': 'right',
+             'bins': [(5, 10, 15), (10, 15, 13), (3, 5, 10), (15, 25, 8),
+                      (0, 3, 6), (25, None, 3), (-3, 0, 2)]},
+        ],
+        'volume': [
+            {'field': 'volume_ratio', 'closed': 'left',
+             'bins': [(0.8, 1.5, 10), (1.5, 2.5, 7), (0.5, 0.8, 5), (2.5, 4.0, 3)]},
+        ],
+        # 估值（25分）：PE10 + PB5 + PR10
+        'valuation': [
+            {'field': 'pe_ratio', 'closed': 'left', 'nonzero': True,
+             'bins': [(0, 10, 10, 'neither'), (10, 20, 7), (20, 30, 4)]},
+            {'field': 'pb_ratio', 'closed': 'left', 'nonzero': True,
+             'bins': [(0, 2, 5, 'neither'), (2, 4, 4), (4, 7, 2)]},
+            {'field': 'pe_roe_ratio', 'closed': 'left',
+             'bins': [(0, 0.8, 10, 'neither'), (0.8, 1.0, 7), (1.0, 1.2, 3)]},
+        ],
+        # 盈利质量（25分）：ROE12 + 利润增长13
+        'profitability': [
+            {'field': 'roe', 'closed': 'right', 'nonzero': True,
+             'bins': [(20, None, 12), (15, None, 10), (10, None, 7), (5, None, 3)]},
+            {'field': 'profit_growth', 'closed': 'right', 'nonzero': True,
+             'bins': [(30, None, 13), (20, None, 10), (10, None, 7), (0, None, 3)]},
+        ],
+        # 安全性（20分）：PB安全边际5 + 波动率8 + 回撤7
+        'safety': [
+            {'field': 'pb_ratio', 'closed': 'left', 'nonzero': True,
+             'bins': [(0, 1.0, 5, 'neither'), (1.0, 1.5, 4), (1.5, 2.5, 2)]},
+            {'field': 'volatility_20d', 'closed': 'left',
+             'bins': [(None, 1.5, 8), (None, 2.5, 6), (None, 3.5, 3)]},
+            {'field': 'max_drawdown_20d', 'closed': 'right',
+             'bins': [(-5, None, 7), (-8, None, 4), (-12, None, 2)]},
+        ],
+        # 分红（5分）
+        'dividend': [
+            {'field': 'dividend_yield', 'closed': 'right', 'nonzero': True,
+             'bins': [(5, None, 5), (3, None, 4), (2, None, 3), (1, None, 2)]},
+        ],
+    },
+    # 5日动量防追高：短期加速过猛时动量分减半
+    'penalties': [
+        {'bucket': 'momentum', 'field': 'momentum_20d', 'above': 10,
+         'short_field': 'momentum_5d', 'ratio': 0.6},
+    ],
+}
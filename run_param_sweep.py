@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+回测参数扫描 - 持仓数量 / 持仓周期 / 止损率 等参数网格并行回测
+数据只加载一次，各参数组合在进程池中并行执行，输出汇总表
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(__file__))
+from config.backtest_config import SWEEP_GRID
+from run_backtest_optimized import SELECTION_CACHE_DIR, load_backtest_context, logger
+from src.backtest.sweep import date_range, run_sweep
+
+
+def main():
+    parser = argparse.ArgumentParser(description='回测参数扫描')
+    parser.add_argument('--workers', type=int, default=None, help='进程数（默认CPU核数）')
+    parser.add_argument('--output', default='./reports/param_sweep.csv', help='结果CSV路径')
+    args = parser.parse_args()
+
+    start, end = date_range(SWEEP_GRID)
+    context = load_backtest_context(start, end)
+
+    t0 = datetime.now()
+    table = run_sweep(context, SWEEP_GRID, max_workers=args.workers,
+                      selection_cache_dir=SELECTION_CACHE_DIR)
+    logger.info(f"参数扫描完成，耗时 {(datetime.now() - t0).total_seconds():.1f}s")
+
+    table = table.sort_values('total_return', ascending=False)
+    print(f"\n{'='*70}")
+    print("  参数扫描结果（累计收益 / 最大回撤 / 胜率 单位%）")
+    print(f"{'='*70}")
+    print(table.to_string(index=False, float_format=lambda v: f'{v:.2f}'))
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    table.to_csv(args.output, index=False, encoding='utf-8-sig')
+    print(f"\n结果已保存: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+滚动窗口回测 - 训练窗口选参 + 测试窗口样本外验证
+各折在进程池中并行执行，共享同一份行情面板；默认只占用一半CPU，可与守护进程同机夜间运行
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(__file__))
+from config.backtest_config import WALK_FORWARD
+from run_backtest_optimized import SELECTION_CACHE_DIR, load_backtest_context, logger
+from src.backtest.walk_forward import make_folds, run_walk_forward, summarize_folds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='滚动窗口回测')
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help='进程数（默认CPU核数的一半）')
+    parser.add_argument('--output', default='./reports/walk_forward.csv', help='结果CSV路径')
+    args = parser.parse_args()
+
+    cfg = WALK_FORWARD
+    folds = make_folds(cfg['start_date'], cfg['end_date'],
+                       cfg['train_months'], cfg['test_months'], cfg.get('step_months'))
+    if not folds:
+        logger.error("回测区间不足一个训练+测试窗口")
+        return
+    context = load_backtest_context(cfg['start_date'], cfg['end_date'])
+
+    t0 = datetime.now()
+    table = run_walk_forward(context, folds, cfg.get('grid'), cfg.get('objective', 'total_return'),
+                             max_workers=args.workers, selection_cache_dir=SELECTION_CACHE_DIR)
+    logger.info(f"滚动窗口回测完成，耗时 {(datetime.now() - t0).total_seconds():.1f}s")
+
+    summary = summarize_folds(table)
+    print(f"\n{'='*70}")
+    print("  滚动窗口回测（测试窗口样本外，收益/回撤单位%）")
+    print(f"{'='*70}")
+    print(table.to_string(index=False, float_format=lambda v: f'{v:.2f}'))
+    print(f"\n  折数: {summary['folds']}  盈利折数: {summary['positive_folds']}")
+    print(f"  样本外复合收益: {summary['compound_return']:+.2f}%")
+    print(f"  单折收益 均值/中位数/最差: {summary['mean_return']:+.2f}% / "
+          f"{summary['median_return']:+.2f}% / {summary['worst_return']:+.2f}%")
+    print(f"  单折最大回撤 均值/最差: {summary['mean_drawdown']:.2f}% / {summary['worst_drawdown']:.2f}%")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    table.to_csv(args.output, index=False, encoding='utf-8-sig')
+    print(f"\n结果已保存: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,16 +5,20 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 import json
 import os
-import requests
 import time
 
 from src.data.data_fetcher import StockDataFetcher
 from src.data.async_data_fetcher import batch_get_stock_data_sync, get_market_overview_sync
 from src.analysis.stock_filter import StockFilter
+from src.analysis.regime import BENCHMARK_SYMBOL, MA_WINDOW, REGIME_DIR, update_regime
+from src.data.array_cache import ArrayCache
+from src.data.kline_store import KlineStore
 from config.config import STOCK_FILTER_CONFIG, DATA_CONFIG
 
 logger = logging.getLogger(__name__)
 
+REGIME_HISTORY_DAYS = 120  # 首次同步沪深300K线的自然日数（覆盖60个交易日以上）
+
 class MarketAnalyzer:
     def __init__(self, use_async: bool = True):
         """
@@ -29,27 +33,31 @@ class MarketAnalyzer:
         self.use_async = use_async
 
     def detect_market_trend(self) -> Dict:
-        """检测沪深300趋势：价格是否站上MA60"""
+        """
+        检测沪深300趋势：价格是否站上MA60
+
+        K线与MA60序列本地持久化、每次只增量更新；盘中调用时K线库会重新下载当天未收盘的K线，
+        趋势序列随之重算最后一根，价格和模式取自调用时的最新行情
+        """
         try:
-            end_date = datetime.now().strftime('%Y-%m-%d')
-            start_date = (datetime.now() - timedelta(days=120)).strftime('%Y-%m-%d')
-            url = f'https://web.ifzq.gtimg.cn/appstock/app/fqkline/get?param=sh000300,day,{start_date},{end_date},100,qfq'
-            resp = requests.get(url, timeout=10)
-            data = resp.json()
-            klines = data.get('data', {}).get('sh000300', {}).get('day', [])
-            if not klines:
-                klines = data.get('data', {}).get('sh000300', {}).get('qfqday', [])
-            if not klines or len(klines) < 60:
+            start_date = (datetime.now() - timedelta(days=REGIME_HISTORY_DAYS)).strftime('%Y-%m-%d')
+            store = KlineStore()
+            if not store.update(BENCHMARK_SYMBOL, start_date):
+                logger.warning("沪深300K线更新失败，使用本地已有数据")
+            bars = store.load_frame(BENCHMARK_SYMBOL)
+            if len(bars) < MA_WINDOW:
                 logger.warning("沪深300K线数据不足60根，默认防守模式")
                 return {'mode': 'defensive', 'price': 0, 'ma60': 0, 'reason': '数据不足'}
 
-            closes = [float(k[2]) for k in klines]
-            current_price = closes[-1]
-            ma60 = np.mean(closes[-60:])
-            is_bull = current_price > ma60
+            regime = update_regime(ArrayCache(REGIME_DIR), BENCHMARK_SYMBOL, bars['close'])
+            latest = regime.latest()
+            current_price = latest['price']
+            ma60 = latest['ma60']
+            is_bull = latest['is_bull']
 
             mode = 'offensive' if is_bull else 'defensive'
-            logger.info(f"趋势检测: 沪深300={current_price:.2f}, MA60={ma60:.2f}, 模式={mode}")
+            logger.info(f"趋势检测({latest['date']:%Y-%m-%d}): 沪深300={current_price:.2f}, "
+                        f"MA60={ma60:.2f}, 模式={mode}")
             return {
                 'mode': mode,
                 'price': current_price,
@@ -122,11 +130,11 @@ class MarketAnalyzer:
             if self.use_async:
                 # 使用异步获取器 - 大幅提升性能
                 logger.info("使用异步批量获取模式 (性能优化)")
+                # 并发数由AIMD控制器自适应调整（上限见 FETCH_CONCURRENCY）
                 all_stock_data = batch_get_stock_data_sync(
                     stock_codes,
                     calculate_momentum=True,
                     include_fundamental=True,
-                    max_concurrent=20  # 可以调整并发数
                 )
             else:
                 # 使用原有的同步方式 - 兼容模式
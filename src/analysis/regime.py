@@ -0,0 +1,121 @@
+"""
+沪深300 MA60 趋势状态
+
+把沪深300收盘价序列连同MA60和牛熊标志一次性算好并持久化，之后只对新增K线增量计算。
+同时保存两种口径：
+- 实盘口径 (ma60 / bull_live)：MA60含当日收盘，MarketAnalyzer.detect_market_trend 使用
+- 回测口径 (ma60_prev / bull_lagged)：MA60取此前60日（不含当日），回测调仓日择时使用，
+  与 simulation.is_bull_market 逐位一致
+"""
+import logging
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from src.data.array_cache import ArrayCache, frame_from_arrays, frame_to_arrays
+
+logger = logging.getLogger(__name__)
+
+BENCHMARK_SYMBOL = 'sh000300'
+MA_WINDOW = 60
+REGIME_DIR = './cache/regime'
+COLUMNS = ['close', 'ma60', 'ma60_prev', 'bull_live', 'bull_lagged']
+
+
+def compute_regime(close: pd.Series, window: int = MA_WINDOW) -> pd.DataFrame:
+    """收盘价序列 -> date索引的 close/ma60/ma60_prev/bull_live/bull_lagged"""
+    values = close.to_numpy(dtype=np.float64)
+    ma = np.full(len(values), np.nan)
+    if len(values) >= window:
+        ma[window - 1:] = sliding_window_view(values, window).mean(axis=1)
+    ma_prev = np.full(len(values), np.nan)
+    ma_prev[1:] = ma[:-1]  # 此前window日均值 = 前一日的含当日均值
+    with np.errstate(invalid='ignore'):
+        return pd.DataFrame({
+            'close': values,
+            'ma60': ma,
+            'ma60_prev': ma_prev,
+            'bull_live': values > ma,
+            'bull_lagged': values > ma_prev,
+        }, index=close.index)
+
+
+class RegimeSeries:
+    """预计算的趋势状态序列"""
+
+    def __init__(self, frame: pd.DataFrame, window: int = MA_WINDOW):
+        self.frame = frame
+        self.window = window
+        self._lagged = dict(zip(frame.index, frame['bull_lagged'].to_numpy()))
+
+    @classmethod
+    def from_close(cls, close: pd.Series, window: int = MA_WINDOW) -> 'RegimeSeries':
+        return cls(compute_regime(close.sort_index(), window), window)
+
+    def extend(self, close: pd.Series) -> 'RegimeSeries':
+        """
+        合并新的收盘价，只重算第一根新增或变化的K线（如上次未收盘的最后一根）之后的部分
+
+        Returns:
+            新的 RegimeSeries（无变化时返回自身）
+        """
+        close = close.sort_index()
+        old = self.frame['close']
+        common = old.index.intersection(close.index)
+        changed = common[old.loc[common].to_numpy() != close.loc[common].to_numpy()]
+        added = close.index.difference(old.index)
+        if not len(changed) and not len(added):
+            return self
+        start = min(list(changed[:1]) + list(added[:1]))
+
+        merged = pd.concat([old[old.index < start], close[close.index >= start]])
+        merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+        # 只需补充 start 之前 window 根K线作为均线窗口
+        pos = merged.index.get_loc(start)
+        tail = compute_regime(merged.iloc[max(0, pos - self.window):], self.window)
+        frame = pd.concat([self.frame[self.frame.index < start], tail[tail.index >= start]])
+        return RegimeSeries(frame, self.window)
+
+    def is_bull(self, today) -> bool:
+        """回测口径：当日收盘价高于此前60日均线"""
+        return bool(self._lagged.get(today, False))
+
+    def latest(self) -> Dict:
+        """实盘口径的最新状态：{'date', 'price', 'ma60', 'is_bull'}"""
+        row = self.frame.iloc[-1]
+        return {
+            'date': self.frame.index[-1],
+            'price': float(row['close']),
+            'ma60': float(row['ma60']),
+            'is_bull': bool(row['bull_live']),
+        }
+
+    def save(self, cache: ArrayCache, key: str):
+        arrays, index = frame_to_arrays(self.frame[COLUMNS])
+        cache.save(key, arrays, {**index, 'window': self.window})
+
+    @classmethod
+    def load(cls, cache: ArrayCache, key: str) -> Optional['RegimeSeries']:
+        loaded = cache.load(key, mmap=False)
+        if loaded is None:
+            return None
+        index, arrays = loaded
+        return cls(frame_from_arrays(index, arrays), index.get('window', MA_WINDOW))
+
+
+def update_regime(cache: ArrayCache, key: str, close: pd.Series,
+                  window: int = MA_WINDOW) -> RegimeSeries:
+    """读取持久化的趋势序列，用最新收盘价增量扩展后写回"""
+    regime = RegimeSeries.load(cache, key)
+    if regime is None or regime.window != window or regime.frame.empty:
+        updated = RegimeSeries.from_close(close, window)
+    else:
+        updated = regime.extend(close)
+    if updated is not regime:
+        try:
+            updated.save(cache, key)
+        except Exception as e:
+            logger.warning(f"保存趋势序列失败: {e}")
+    return updated
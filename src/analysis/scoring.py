@@ -0,0 +1,203 @@
+"""
+评分分档表的编译与求值
+
+config/scoring_tables.py 中的分档阶梯在构造时编译为有序边界数组和对应分数，
+单只股票用 bisect、批量股票用 np.searchsorted 在同一组数组上查表，两条路径结果一致：
+- 分档按"顺序首个命中"定义，编译时在每个边界点及相邻边界之间取样求值，
+  因此阶梯之间可以重叠（与 if/elif 链等价）
+- None 记为 NaN，不得分；nonzero 阶梯中0也不得分
+- 需要取整的阶梯把边界换算为原始值上的边界，避免 np.round 与内置 round 的舍入差异
+"""
+import math
+from bisect import bisect_right
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# 字段缺失时的默认值（与逐只评分中 stock_data.get 的默认值一致）
+FIELD_DEFAULTS = {
+    'volume_ratio': 1.0,
+}
+
+
+def _pr_ratio(pe, roe):
+    """市赚率 PR = PE / (100 * ROE)，对应 StockFilter.calculate_pr_ratio（取整由阶梯的round完成）"""
+    valid = (pe > 0) & (roe > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(valid, pe / (100 * np.where(valid, roe, 1)), 0.0)
+
+
+def _pe_roe_ratio(pe, roe):
+    """回测评分中的 PR = PE / ROE（ROE为百分数），PE或ROE无效时为NaN"""
+    valid = (pe != 0) & (roe > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(valid, pe / (100 * np.where(valid, roe, 1) / 100), np.nan)
+
+
+# 派生字段 -> (依赖字段, 计算函数)；计算函数同时接受数组和标量
+DERIVED_FIELDS = {
+    'pr_ratio': (('pe_ratio', 'roe'), _pr_ratio),
+    'pe_roe_ratio': (('pe_ratio', 'roe'), _pe_roe_ratio),
+}
+
+
+def _to_float(value) -> float:
+    return np.nan if value is None else float(value)
+
+
+def _round_boundary(threshold: float, ndigits: int, strict: bool = False) -> float:
+    """
+    最小的浮点数x，使 round(x, ndigits) >= threshold（strict时为 > threshold）
+    """
+    scale = Decimal(10) ** ndigits
+    units = Decimal(repr(threshold)) * scale
+    units = math.floor(units) + 1 if strict else math.ceil(units)
+    target = float(Decimal(units) / scale)
+
+    x = target - 0.5 * 10 ** -ndigits
+    while round(x, ndigits) >= target:
+        x = float(np.nextafter(x, -np.inf))
+    while round(x, ndigits) < target:
+        x = float(np.nextafter(x, np.inf))
+    return x
+
+
+def _matches(x: float, lo: Optional[float], hi: Optional[float], closed: str) -> bool:
+    if lo is not None and not (x >= lo if closed in ('left', 'both') else x > lo):
+        return False
+    if hi is not None and not (x <= hi if closed in ('right', 'both') else x < hi):
+        return False
+    return True
+
+
+class Ladder:
+    """编译后的单字段分档阶梯"""
+
+    def __init__(self, spec: Dict):
+        self.field = spec['field']
+        self.nonzero = spec.get('nonzero', False)
+        digits = spec.get('round')
+        default_closed = spec.get('closed', 'left')
+        rules = [(b[0], b[1], b[2], b[3] if len(b) > 3 else default_closed) for b in spec['bins']]
+
+        edges = sorted({v for lo, hi, _, _ in rules for v in (lo, hi) if v is not None})
+
+        # 取样点：区间0, 边界0, 区间1, 边界1, ..., 区间n
+        samples = []
+        for k, edge in enumerate(edges):
+            samples.append(edge - 1 if k == 0 else (edges[k - 1] + edge) / 2)
+            samples.append(edge)
+        samples.append(edges[-1] + 1 if edges else 0)
+
+        def first_match(x):
+            for lo, hi, points, closed in rules:
+                if _matches(x, lo, hi, closed):
+                    return points
+            return 0
+
+        self.points = [first_match(x) for x in samples]
+
+        # 原始值上的边界：[等于边界k的起点, 大于边界k的起点]，bisect_right 后的位置即取样点序号
+        bounds = []
+        for edge in edges:
+            if digits is None:
+                bounds += [float(edge), float(np.nextafter(edge, np.inf))]
+            else:
+                bounds += [_round_boundary(edge, digits), _round_boundary(edge, digits, strict=True)]
+        self.bounds = bounds
+        self._bounds_array = np.array(bounds, dtype=np.float64)
+        self._points_array = np.array(self.points, dtype=np.int64)
+
+    def score(self, x: float) -> int:
+        """单个取值的得分"""
+        if x != x or (self.nonzero and x == 0):
+            return 0
+        return self.points[bisect_right(self.bounds, x)]
+
+    def score_array(self, x: np.ndarray) -> np.ndarray:
+        """批量得分（整数数组）"""
+        result = self._points_array[np.searchsorted(self._bounds_array, x, side='right')]
+        invalid = np.isnan(x)
+        if self.nonzero:
+            invalid |= x == 0
+        result[invalid] = 0
+        return result
+
+
+class ScoreTable:
+    """编译后的评分表：{分项: [阶梯]} + 跨字段减分规则"""
+
+    def __init__(self, table: Dict):
+        self.buckets = {name: [Ladder(spec) for spec in specs]
+                        for name, specs in table['buckets'].items()}
+        self.penalties = list(table.get('penalties', []))
+
+        fields = []
+        for ladders in self.buckets.values():
+            for ladder in ladders:
+                fields.extend(DERIVED_FIELDS[ladder.field][0] if ladder.field in DERIVED_FIELDS
+                              else (ladder.field,))
+        for rule in self.penalties:
+            fields.extend((rule['field'], rule['short_field']))
+        self.fields = list(dict.fromkeys(fields))
+        self.derived = list(dict.fromkeys(
+            ladder.field for ladders in self.buckets.values() for ladder in ladders
+            if ladder.field in DERIVED_FIELDS))
+
+    def _values(self, stock_data: Dict) -> Dict[str, float]:
+        values = {f: _to_float(stock_data.get(f, FIELD_DEFAULTS.get(f, 0))) for f in self.fields}
+        for name in self.derived:
+            inputs, func = DERIVED_FIELDS[name]
+            values[name] = float(func(*(np.float64(values[f]) for f in inputs)))
+        return values
+
+    def score(self, stock_data: Dict) -> Tuple[int, Dict[str, int]]:
+        """单只股票评分，返回 (总分, 分项得分)"""
+        values = self._values(stock_data)
+        breakdown = {name: sum(ladder.score(values[ladder.field]) for ladder in ladders)
+                     for name, ladders in self.buckets.items()}
+        for rule in self.penalties:
+            base = values[rule['field']]
+            if base > rule['above'] and values[rule['short_field']] > base * rule['ratio']:
+                breakdown[rule['bucket']] //= 2
+        return sum(breakdown.values()), breakdown
+
+    def columns(self, stocks_data: List[Dict]) -> Dict[str, np.ndarray]:
+        """股票字典列表 -> 评分所需字段的float64数组（含派生字段）"""
+        columns = {}
+        for f in self.fields:
+            default = FIELD_DEFAULTS.get(f, 0)
+            columns[f] = np.array([_to_float(s.get(f, default)) for s in stocks_data], dtype=np.float64)
+        for name in self.derived:
+            inputs, func = DERIVED_FIELDS[name]
+            columns[name] = func(*(columns[f] for f in inputs))
+        return columns
+
+    def score_columns(self, columns: Dict[str, np.ndarray]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """批量评分，返回 (总分数组, 分项 -> 分数数组)"""
+        n = len(columns[self.fields[0]])
+        breakdown = {}
+        for name, ladders in self.buckets.items():
+            points = np.zeros(n, dtype=np.int64)
+            for ladder in ladders:
+                points += ladder.score_array(columns[ladder.field])
+            breakdown[name] = points
+        for rule in self.penalties:
+            base = columns[rule['field']]
+            hot = (base > rule['above']) & (columns[rule['short_field']] > base * rule['ratio'])
+            breakdown[rule['bucket']] = np.where(hot, breakdown[rule['bucket']] // 2,
+                                                 breakdown[rule['bucket']])
+        total = np.zeros(n, dtype=np.int64)
+        for points in breakdown.values():
+            total += points
+        return total, breakdown
+
+    def score_batch(self, stocks_data: List[Dict]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """股票列表批量评分"""
+        return self.score_columns(self.columns(stocks_data))
+
+
+def compile_tables(tables: Dict[str, Dict]) -> Dict[str, ScoreTable]:
+    """编译一组评分表"""
+    return {name: ScoreTable(table) for name, table in tables.items()}
@@ -1,15 +1,33 @@
 import pandas as pd
 import numpy as np
+import hashlib
+import json
 import logging
 from typing import List, Dict, Tuple
 from datetime import datetime, timedelta
 from config.config import STOCK_FILTER_CONFIG
+from config.scoring_tables import STOCK_FILTER_TABLES
+from src.analysis.scoring import compile_tables
 
 logger = logging.getLogger(__name__)
 
 class StockFilter:
-    def __init__(self, config: Dict = None):
+    def __init__(self, config: Dict = None, tables: Dict = None):
+        """
+        Args:
+            config: 筛选参数，默认 STOCK_FILTER_CONFIG
+            tables: 评分分档表，默认 STOCK_FILTER_TABLES（参数扫描时可替换）
+        """
         self.config = config or STOCK_FILTER_CONFIG
+        self.table_specs = tables or STOCK_FILTER_TABLES
+        self.tables = compile_tables(self.table_specs)
+
+    def fingerprint(self) -> str:
+        """筛选参数+评分分档表的指纹（用于选股结果缓存的键），止损线只影响卖出，不计入"""
+        config = {k: v for k, v in self.config.items() if k != 'stop_loss_pct'}
+        payload = json.dumps({'config': config, 'tables': self.table_specs},
+                             sort_keys=True, default=repr)
+        return hashlib.sha1(payload.encode()).hexdigest()
 
     def calculate_pr_ratio(self, stock_data: Dict) -> float:
         """计算市赚率PR = PE / (100 * ROE)"""
@@ -27,128 +45,15 @@ class StockFilter:
 
     def calculate_strength_score(self, stock_data: Dict) -> Dict:
         """计算股票强势分数"""
-        score_breakdown = {
-            'technical': 0,    # 技术面 (30分): 动量25 + 换手率5
-            'valuation': 0,    # 估值 (25分): PE10 + PB5 + PR10
-            'profitability': 0,  # 盈利质量 (30分): ROE15 + 利润增长15
-            'safety': 0,       # 安全性 (10分): PB安全边际5 + 低换手率5
-            'dividend': 0      # 分红 (5分): 股息率
-        }
-
         try:
-            # ===== 1. 技术面得分 (30分) =====
-            # 1.1 20日动量 (25分)
-            momentum = stock_data.get('momentum_20d', 0)
-            if momentum > 15:
-                score_breakdown['technical'] += 25
-            elif momentum > 10:
-                score_breakdown['technical'] += 20
-            elif momentum > 5:
-                score_breakdown['technical'] += 14
-            elif momentum > 0:
-                score_breakdown['technical'] += 8
-            elif momentum > -5:
-                score_breakdown['technical'] += 3
-
-            # 1.2 流动性-换手率 (5分)
-            turnover_rate = stock_data.get('turnover_rate', 0)
-            if turnover_rate and 1 <= turnover_rate < 3:
-                score_breakdown['technical'] += 5
-            elif turnover_rate and 3 <= turnover_rate < 5:
-                score_breakdown['technical'] += 4
-            elif turnover_rate and 5 <= turnover_rate < 8:
-                score_breakdown['technical'] += 3
-            elif turnover_rate and 0.5 <= turnover_rate < 1:
-                score_breakdown['technical'] += 2
-
-            # ===== 2. 估值得分 (20分) =====
-            # 2.1 PE估值 (10分)
-            pe = stock_data.get('pe_ratio', 0)
-            if pe and 0 < pe < 10:
-                score_breakdown['valuation'] += 10
-            elif pe and 10 <= pe < 20:
-                score_breakdown['valuation'] += 7
-            elif pe and 20 <= pe < 30:
-                score_breakdown['valuation'] += 4
-
-            # 2.2 PB估值 (5分)
-            pb = stock_data.get('pb_ratio', 0)
-            if pb and 0 < pb < 2:
-                score_breakdown['valuation'] += 5
-            elif pb and 2 <= pb < 4:
-                score_breakdown['valuation'] += 4
-            elif pb and 4 <= pb < 7:
-                score_breakdown['valuation'] += 2
-
-            # 2.3 PR市赚率 (10分)
-            pr = self.calculate_pr_ratio(stock_data)
-            if pr and 0 < pr < 0.8:
-                score_breakdown['valuation'] += 10
-            elif pr and 0.8 <= pr < 1:
-                score_breakdown['valuation'] += 7
-            elif pr and 1 <= pr < 1.2:
-                score_breakdown['valuation'] += 3
-
-            # ===== 3. 盈利质量得分 (30分) =====
-            # 3.1 ROE (15分)
-            roe = stock_data.get('roe', 0)
-            if roe and roe > 20:
-                score_breakdown['profitability'] += 15
-            elif roe and roe > 15:
-                score_breakdown['profitability'] += 12
-            elif roe and roe > 10:
-                score_breakdown['profitability'] += 8
-            elif roe and roe > 5:
-                score_breakdown['profitability'] += 4
-
-            # 3.2 净利润增长率 (15分)
-            profit_growth = stock_data.get('profit_growth', 0)
-            if profit_growth and profit_growth > 30:
-                score_breakdown['profitability'] += 15
-            elif profit_growth and profit_growth > 20:
-                score_breakdown['profitability'] += 12
-            elif profit_growth and profit_growth > 10:
-                score_breakdown['profitability'] += 8
-            elif profit_growth and profit_growth > 0:
-                score_breakdown['profitability'] += 4
-
-            # ===== 4. 安全性得分 (10分) =====
-            # 4.1 PB安全边际 (5分)
-            pb = stock_data.get('pb_ratio', 0)
-            if pb and 0 < pb < 1.0:
-                score_breakdown['safety'] += 5
-            elif pb and 1.0 <= pb < 1.5:
-                score_breakdown['safety'] += 4
-            elif pb and 1.5 <= pb < 2.5:
-                score_breakdown['safety'] += 2
-
-            # 4.2 低换手率-筹码稳定 (5分)
-            turnover_rate = stock_data.get('turnover_rate', 0)
-            if turnover_rate and 0 < turnover_rate < 2:
-                score_breakdown['safety'] += 5
-            elif turnover_rate and 2 <= turnover_rate < 5:
-                score_breakdown['safety'] += 3
-            elif turnover_rate and 5 <= turnover_rate < 10:
-                score_breakdown['safety'] += 1
-
-            # ===== 5. 分红得分 (5分) =====
-            dividend_yield = stock_data.get('dividend_yield', 0)
-            if dividend_yield and dividend_yield > 5:
-                score_breakdown['dividend'] += 5
-            elif dividend_yield and dividend_yield > 3:
-                score_breakdown['dividend'] += 4
-            elif dividend_yield and dividend_yield > 2:
-                score_breakdown['dividend'] += 3
-            elif dividend_yield and dividend_yield > 1:
-                score_breakdown['dividend'] += 2
-            elif dividend_yield and dividend_yield > 0.5:
-                score_breakdown['dividend'] += 1
-
+            # 技术面(动量+换手率) / 估值(PE+PB+PR) / 盈利质量(ROE+利润增长) / 安全性(PB+低换手率) / 分红
+            # 分档见 config/scoring_tables.py
+            total_score, score_breakdown = self.tables['strength'].score(stock_data)
         except Exception as e:
             logger.error(f"计算强势分数失败: {e}")
+            score_breakdown = {name: 0 for name in self.tables['strength'].buckets}
             return {'total': 0, 'breakdown': score_breakdown, 'grade': 'D'}
 
-        total_score = sum(score_breakdown.values())
         grade = self._get_grade(total_score)
 
         return {
@@ -172,6 +77,51 @@ class StockFilter:
         else:
             return 'D'
 
+    def calculate_scores_batch(self, stocks_data: List[Dict], mode: str = 'normal') -> Dict:
+        """
+        批量计算评分（向量化，结果与逐只计算的 calculate_*_score 一致）
+
+        Args:
+            stocks_data: 股票数据列表
+            mode: 'normal'（强势分数）/ 'offensive'（进攻）/ 'ultra_defensive'（超防守）
+
+        Returns:
+            {'total': 总分数组, 'breakdown': {分项: 分数数组}, 'bonus': 进攻加分数组（仅offensive）}
+        """
+        if mode == 'ultra_defensive':
+            total, breakdown = self.tables['ultra_defensive'].score_batch(stocks_data)
+            return {'total': total, 'breakdown': breakdown}
+
+        total, breakdown = self.tables['strength'].score_batch(stocks_data)
+        if mode == 'offensive':
+            bonus, _ = self.tables['offensive_bonus'].score_batch(stocks_data)
+            return {'total': total + bonus, 'breakdown': breakdown, 'bonus': bonus}
+        return {'total': total, 'breakdown': breakdown}
+
+    def _apply_batch_scores(self, stocks_data: List[Dict], mode: str = 'normal') -> List[Dict]:
+        """批量评分并写回每只股票，返回按分数从高到低排序（同分保持原顺序）的列表"""
+        if not stocks_data:
+            return []
+        result = self.calculate_scores_batch(stocks_data, mode)
+        totals = result['total'].tolist()
+        breakdowns = {name: points.tolist() for name, points in result['breakdown'].items()}
+        bonuses = result['bonus'].tolist() if 'bonus' in result else None
+
+        for i, stock in enumerate(stocks_data):
+            detail = {
+                'total': totals[i],
+                'breakdown': {name: points[i] for name, points in breakdowns.items()},
+                'grade': self._get_grade(totals[i]),
+            }
+            if bonuses is not None:
+                detail['bonus'] = bonuses[i]
+            stock['strength_score_detail'] = detail
+            stock['strength_score'] = detail['total']
+            stock['strength_grade'] = detail['grade']
+
+        order = np.argsort(-result['total'], kind='stable')
+        return [stocks_data[i] for i in order]
+
     def filter_by_pe_ratio(self, stocks_data: List[Dict]) -> List[Dict]:
         """按市盈率筛选股票"""
         filtered_stocks = []
@@ -196,17 +146,8 @@ class StockFilter:
     def filter_by_strength(self, stocks_data: List[Dict]) -> List[Dict]:
         """按强势指标筛选股票"""
         try:
-            # 计算每只股票的强势分数
-            for stock in stocks_data:
-                score_result = self.calculate_strength_score(stock)
-                stock['strength_score_detail'] = score_result  # 保存详细评分
-                stock['strength_score'] = score_result['total']  # 保存总分
-                stock['strength_grade'] = score_result['grade']  # 保存评级
-
-            # 按强势分数排序，选择前N只
-            sorted_stocks = sorted(stocks_data,
-                                 key=lambda x: x['strength_score'],
-                                 reverse=True)
+            # 批量计算强势分数（保存详细评分、总分、评级），并按分数排序
+            sorted_stocks = self._apply_batch_scores(stocks_data)
 
             # 根据配置的最小强势分数筛选
             min_score = self.config.get('min_strength_score', 45)  # 降低到45分
@@ -301,18 +242,7 @@ class StockFilter:
         base_result = self.calculate_strength_score(stock_data)
         base_score = base_result['total']
 
-        momentum = stock_data.get('momentum_20d', 0)
-        bonus = 0
-        if momentum > 15:
-            bonus += 12
-        elif momentum > 10:
-            bonus += 8
-        elif momentum > 5:
-            bonus += 4
-
-        growth = stock_data.get('profit_growth')
-        if growth and growth > 30:
-            bonus += 5
+        bonus, _ = self.tables['offensive_bonus'].score(stock_data)
 
         total = base_score + bonus
         grade = self._get_grade(total)
@@ -320,51 +250,7 @@ class StockFilter:
 
     def calculate_ultra_defensive_score(self, stock_data: Dict) -> Dict:
         """超防守评分：极低波动+低PB+高ROE+小回撤"""
-        score = 0
-        breakdown = {'low_volatility': 0, 'low_pb': 0, 'high_roe': 0, 'small_drawdown': 0, 'momentum_bonus': 0}
-
-        volatility = stock_data.get('volatility_20d', 0)
-        pb = stock_data.get('pb_ratio')
-        roe = stock_data.get('roe')
-        max_dd = stock_data.get('max_drawdown_20d', 0)
-        momentum = stock_data.get('momentum_20d', 0)
-
-        if volatility < 1.0:
-            breakdown['low_volatility'] = 30
-        elif volatility < 1.5:
-            breakdown['low_volatility'] = 25
-        elif volatility < 2.0:
-            breakdown['low_volatility'] = 18
-        elif volatility < 2.5:
-            breakdown['low_volatility'] = 10
-
-        if pb and 0 < pb < 0.8:
-            breakdown['low_pb'] = 25
-        elif pb and 0.8 <= pb < 1.2:
-            breakdown['low_pb'] = 20
-        elif pb and 1.2 <= pb < 2.0:
-            breakdown['low_pb'] = 12
-        elif pb and 2.0 <= pb < 3.0:
-            breakdown['low_pb'] = 5
-
-        if roe and roe > 15:
-            breakdown['high_roe'] = 25
-        elif roe and roe > 10:
-            breakdown['high_roe'] = 18
-        elif roe and roe > 7:
-            breakdown['high_roe'] = 10
-
-        if max_dd > -3:
-            breakdown['small_drawdown'] = 20
-        elif max_dd > -5:
-            breakdown['small_drawdown'] = 14
-        elif max_dd > -8:
-            breakdown['small_drawdown'] = 7
-
-        if 0 < momentum <= 5:
-            breakdown['momentum_bonus'] = 5
-
-        score = sum(breakdown.values())
+        score, breakdown = self.tables['ultra_defensive'].score(stock_data)
         grade = self._get_grade(score)
         return {'total': score, 'breakdown': breakdown, 'grade': grade}
 
@@ -380,13 +266,7 @@ class StockFilter:
         pe_filtered = self.filter_by_pe_ratio(stocks_data)
         additional_filtered = self.apply_additional_filters(pe_filtered)
 
-        for stock in additional_filtered:
-            score_result = self.calculate_offensive_score(stock)
-            stock['strength_score_detail'] = score_result
-            stock['strength_score'] = score_result['total']
-            stock['strength_grade'] = score_result['grade']
-
-        sorted_stocks = sorted(additional_filtered, key=lambda x: x['strength_score'], reverse=True)
+        sorted_stocks = self._apply_batch_scores(additional_filtered, 'offensive')
         final = sorted_stocks[:self.config['max_stocks']]
         for i, stock in enumerate(final):
             stock['rank'] = i + 1
@@ -406,13 +286,7 @@ class StockFilter:
         pe_filtered = self.filter_by_pe_ratio(stocks_data)
         additional_filtered = self.apply_additional_filters(pe_filtered)
 
-        for stock in additional_filtered:
-            score_result = self.calculate_ultra_defensive_score(stock)
-            stock['strength_score_detail'] = score_result
-            stock['strength_score'] = score_result['total']
-            stock['strength_grade'] = score_result['grade']
-
-        sorted_stocks = sorted(additional_filtered, key=lambda x: x['strength_score'], reverse=True)
+        sorted_stocks = self._apply_batch_scores(additional_filtered, 'ultra_defensive')
         final = sorted_stocks[:self.config['max_stocks']]
         for i, stock in enumerate(final):
             stock['rank'] = i + 1
@@ -0,0 +1,5 @@
+from .panel import DailyPanel
+from .simulation import BacktestContext, simulate
+from .engine import Strategy, run_strategies
+
+__all__ = ['DailyPanel', 'BacktestContext', 'simulate', 'Strategy', 'run_strategies']
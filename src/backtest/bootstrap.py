@@ -0,0 +1,90 @@
+"""
+回测结果稳健性检验（块自助法）
+
+从逐日净值得到日收益序列，按固定长度的连续块（保留短期自相关，如持仓期内的收益相关性）
+循环有放回抽样，拼接成与原序列等长的收益路径，统计每条路径的累计收益和最大回撤，
+给出置信区间。全部路径以矩阵运算生成，按批处理控制内存，1万条路径不到1秒。
+"""
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+BATCH_PATHS = 2000  # 每批生成的路径数（路径数 × 天数 的矩阵按批分配）
+
+
+def daily_returns(navs: Sequence[float]) -> np.ndarray:
+    """逐日净值 -> 日收益率"""
+    navs = np.asarray(navs, dtype=np.float64)
+    return navs[1:] / navs[:-1] - 1
+
+
+def block_bootstrap_paths(returns: np.ndarray, n_paths: int, block_size: int,
+                          rng: np.random.Generator) -> np.ndarray:
+    """
+    循环块自助抽样
+
+    Returns:
+        shape为(n_paths, len(returns))的重采样日收益矩阵
+    """
+    n = len(returns)
+    n_blocks = -(-n // block_size)
+    starts = rng.integers(0, n, size=(n_paths, n_blocks))
+    idx = (starts[:, :, None] + np.arange(block_size)) % n
+    return returns[idx.reshape(n_paths, -1)[:, :n]]
+
+
+def path_metrics(returns: np.ndarray) -> Dict[str, np.ndarray]:
+    """每条收益路径的累计收益和最大回撤（起点净值1.0计入峰值）"""
+    navs = np.cumprod(1 + returns, axis=1)
+    peaks = np.maximum(np.maximum.accumulate(navs, axis=1), 1.0)
+    return {
+        'total_return': navs[:, -1] - 1,
+        'max_drawdown': ((peaks - navs) / peaks).max(axis=1),
+    }
+
+
+def bootstrap_navs(navs: Sequence[float], n_paths: int = 10000, block_size: int = 10,
+                   seed: Optional[int] = None,
+                   quantiles: Sequence[float] = DEFAULT_QUANTILES) -> Dict:
+    """
+    对逐日净值做块自助重采样
+
+    Args:
+        navs: 逐日净值（如 run_backtest 的 daily_navs）
+        n_paths: 重采样路径数
+        block_size: 块长度（交易日），默认约等于一个持仓周期以上
+        seed: 随机种子（结果可复现）
+
+    Returns:
+        {'paths', 'block_size', 'quantiles',
+         'total_return': {分位: 值%}, 'max_drawdown': {分位: 值%},
+         'prob_loss': 累计亏损概率%, 'observed': {'total_return', 'max_drawdown'}}
+    """
+    returns = daily_returns(navs)
+    if len(returns) < 2:
+        raise ValueError("净值序列过短，无法重采样")
+    block_size = max(1, min(block_size, len(returns)))
+    rng = np.random.default_rng(seed)
+
+    total_return = np.empty(n_paths)
+    max_drawdown = np.empty(n_paths)
+    for lo in range(0, n_paths, BATCH_PATHS):
+        hi = min(lo + BATCH_PATHS, n_paths)
+        metrics = path_metrics(block_bootstrap_paths(returns, hi - lo, block_size, rng))
+        total_return[lo:hi] = metrics['total_return']
+        max_drawdown[lo:hi] = metrics['max_drawdown']
+
+    observed = path_metrics(returns[None, :])
+    return {
+        'paths': n_paths,
+        'block_size': block_size,
+        'quantiles': list(quantiles),
+        'total_return': dict(zip(quantiles, np.quantile(total_return, quantiles) * 100)),
+        'max_drawdown': dict(zip(quantiles, np.quantile(max_drawdown, quantiles) * 100)),
+        'prob_loss': float((total_return < 0).mean() * 100),
+        'observed': {
+            'total_return': float(observed['total_return'][0] * 100),
+            'max_drawdown': float(observed['max_drawdown'][0] * 100),
+        },
+    }
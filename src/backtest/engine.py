@@ -0,0 +1,300 @@
+"""
+事件驱动回测引擎
+
+单次遍历调仓日，每个调仓日的公共状态（大盘趋势、全市场stock_data）只计算一次，
+同一遍内可以同时回测多个策略。使用同一个 selector 对象的策略共享选股结果：
+每个调仓日每个趋势状态只选一次股，只有止损/成本不同的策略变体不再重复选股。
+选股完成后，各策略的逐日净值与止损按全部持有期向量化计算。策略由四个可替换的钩子组成：
+- regime:   趋势判断 (context, today) -> 状态（如 MA60 牛/熊）
+- selector: 选股 (all_stocks, regime状态) -> 选中的股票列表
+- stop:     止损规则（触发线、止损卖出收益、调仓日结算收益）
+- cost:     交易成本模型
+
+持仓/止损/净值的记账方式与原 run_backtest 循环一致：
+- 调仓日结算旧持仓（含已止损锁定的收益），扣除往返成本后按等权重新建仓
+- 非调仓日逐日检查止损，触发后锁定收益并移出持仓，其余仓位继续持有
+- 数据缺失的持仓当日不贡献收益
+- 持仓全部止损后，当期剩余交易日净值停留在期初净值（原绘图脚本的逐日循环没有这一步，
+  此时净值仍计入已锁定的止损收益，两者在这种情况下不同）
+"""
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.backtest.selection_cache import SelectionCache
+from src.backtest.simulation import BacktestContext, build_day_stocks
+
+
+# ===== 钩子：趋势判断 =====
+
+def ma60_regime(context: BacktestContext, today) -> bool:
+    """沪深300站上此前60日均线为牛市(True)，读取预计算的趋势序列"""
+    return context.regime_series().is_bull(today)
+
+
+# ===== 钩子：选股 =====
+
+def regime_selector(bull: Callable, bear: Callable) -> Callable:
+    """按趋势状态切换选股函数：牛市用bull，熊市用bear"""
+    def select(all_stocks, regime):
+        return bull(all_stocks) if regime else bear(all_stocks)
+    return select
+
+
+def fixed_selector(selector: Callable) -> Callable:
+    """不区分趋势状态的选股"""
+    def select(all_stocks, regime):
+        return selector(all_stocks)
+    return select
+
+
+# ===== 钩子：止损规则 =====
+
+class RealStop:
+    """触发止损线后按当日实际跌幅卖出"""
+
+    def __init__(self, threshold: float = -0.05):
+        self.threshold = threshold
+
+    def triggered(self, ret):
+        """是否触发止损（支持数组）"""
+        return ret < self.threshold
+
+    def exit_return(self, ret, cost: float):
+        """止损卖出锁定的收益（单位仓位，支持数组）"""
+        return ret - cost
+
+    def settle_return(self, ret):
+        """调仓日结算时的收益（支持数组）"""
+        return ret
+
+
+class CappedStop(RealStop):
+    """止损亏损按止损线封顶（理想化成交），调仓日结算同样封顶"""
+
+    def exit_return(self, ret, cost: float):
+        return np.full(np.shape(ret), self.threshold - cost)
+
+    def settle_return(self, ret):
+        return np.where(ret < self.threshold, self.threshold, ret)
+
+
+class NoStop(RealStop):
+    """不止损，持有到调仓日"""
+
+    def __init__(self):
+        super().__init__(threshold=-np.inf)
+
+    def triggered(self, ret):
+        return np.zeros(np.shape(ret), dtype=bool)
+
+
+# ===== 钩子：交易成本 =====
+
+@dataclass
+class CostModel:
+    """买卖双边成本，调仓与止损卖出均按往返成本计"""
+    cost_buy: float = 0.001
+    cost_sell: float = 0.0015
+
+    @property
+    def round_trip(self) -> float:
+        return self.cost_buy + self.cost_sell
+
+
+@dataclass
+class Strategy:
+    """一个回测策略"""
+    name: str
+    selector: Callable
+    regime: Optional[Callable] = ma60_regime
+    stop: RealStop = field(default_factory=RealStop)
+    cost: CostModel = field(default_factory=CostModel)
+    hold_days: int = 7
+    selection_key: Optional[str] = None  # 选股逻辑+参数的唯一标识，设置后选股结果可持久化缓存
+
+
+@dataclass
+class StrategyResult:
+    """策略回测结果"""
+    name: str
+    navs: List[float]       # 逐日净值
+    periods: List[Dict]     # 每期结果（同 print_results 的输入）
+
+
+def simulate_windows(close: np.ndarray, day_rows: np.ndarray, hold_days: int,
+                     holdings: List[List[Tuple]], stop: RealStop, cost: float) -> Tuple[List[float], List[Tuple]]:
+    """
+    按调仓日建仓序列向量化模拟逐日净值与止损
+
+    所有持有期一次性构成收益张量 R[期, 日, 股] = 收盘/买入价 - 1（不足的期/日/股以NaN填充），
+    每只股票取首个触发止损的日期，触发当日按止损规则锁定收益并移出持仓；数据缺失当日不贡献收益；
+    当日开盘前已全部止损时净值停留在期初净值。期初净值按各期结算结果逐期连乘。
+    求和按持仓顺序/止损发生顺序逐项累加（cumsum），结果与逐日循环逐位一致。
+
+    Args:
+        close: 面板收盘价
+        day_rows: 回测交易日对应的面板行号
+        hold_days: 持仓周期，第 w 期在第 w*hold_days 个交易日建仓
+        holdings: 每期建仓列表 [(col, buy_price, weight)]
+
+    Returns:
+        (逐日净值, 各期结算 [(期序号, 期收益, 持仓数, 盈利数)])
+    """
+    n = len(day_rows)
+    W = len(holdings)
+    M = hold_days - 1                      # 每期内的非调仓日数
+    K = max([len(h) for h in holdings] + [1])
+
+    cols = np.zeros((W, K), dtype=np.int64)
+    buy_prices = np.ones((W, K))
+    weights = np.zeros((W, K))
+    present = np.zeros((W, K), dtype=bool)
+    for w, window in enumerate(holdings):
+        for h, (col, buy_price, weight) in enumerate(window):
+            cols[w, h], buy_prices[w, h], weights[w, h] = col, buy_price, weight
+            present[w, h] = True
+
+    starts = np.arange(W) * hold_days
+    days = np.arange(M)
+    day_idx = starts[:, None] + 1 + days
+    rows = day_rows[np.minimum(day_idx, n - 1)]
+    with np.errstate(invalid='ignore'):
+        ret = close[rows[:, :, None], cols[:, None, :]] / buy_prices[:, None, :] - 1
+        ret = np.where((day_idx < n)[:, :, None] & present[:, None, :], ret, np.nan)
+        triggered = np.asarray(stop.triggered(ret), dtype=bool) & ~np.isnan(ret)
+    # 首个触发日，未触发（含填充的股票）记为M
+    if M > 0:
+        stop_day = np.where(triggered.any(axis=1), triggered.argmax(axis=1), M)
+    else:
+        stop_day = np.zeros((W, K), dtype=np.int64)
+    stopped = stop_day < M
+
+    held = (days[None, :, None] < stop_day[:, None, :]) & ~np.isnan(ret)
+    port_return = np.cumsum(np.where(held, weights[:, None, :] * ret, 0.0), axis=2)[:, :, -1]
+
+    # 止损锁定收益按发生顺序累加（同日按持仓顺序）
+    locked = np.zeros((W, K))
+    if M > 0:
+        w_idx, h_idx = np.nonzero(stopped)
+        exit_ret = ret[w_idx, stop_day[w_idx, h_idx], h_idx]
+        locked[w_idx, h_idx] = weights[w_idx, h_idx] * stop.exit_return(exit_ret, cost)
+    order = np.argsort(stop_day, axis=1, kind='stable')
+    cash_by_count = np.concatenate(
+        [np.zeros((W, 1)), np.cumsum(np.take_along_axis(locked, order, axis=1), axis=1)], axis=1)
+    stops_by_day = (stop_day[:, None, :] <= days[None, :, None]).sum(axis=2)
+    cash_return = np.take_along_axis(cash_by_count, stops_by_day, axis=1)
+
+    growth = 1 + port_return + cash_return
+    empty = ((stop_day[:, None, :] < days[None, :, None]) | ~present[:, None, :]).all(axis=2)
+
+    # 调仓日结算：剩余持仓按结算规则计收益，加上本期止损锁定的收益
+    remaining = present & ~stopped
+    settle_idx = starts + hold_days
+    settle_rows = day_rows[np.minimum(settle_idx, n - 1)]
+    with np.errstate(invalid='ignore'):
+        settle_ret = close[settle_rows[:, None], cols] / buy_prices - 1
+        priced = remaining & ~np.isnan(settle_ret)
+        settle_port = np.cumsum(np.where(priced, weights * stop.settle_return(settle_ret), 0.0), axis=1)[:, -1]
+        win_count = (priced & (settle_ret > 0)).sum(axis=1)
+    period_ret = settle_port + cash_by_count[np.arange(W), stopped.sum(axis=1)]
+    settles = (settle_idx < n) & remaining.any(axis=1)
+
+    navs = []
+    settlements = []
+    nav_base = 1.0
+    for w in range(W):
+        navs.append(nav_base)
+        m = min(M, n - starts[w] - 1)
+        navs.extend(np.where(empty[w, :m], nav_base, nav_base * growth[w, :m]).tolist())
+        if settles[w]:
+            settlements.append((w, period_ret[w], int(present[w].sum()), int(win_count[w])))
+            nav_base = nav_base * (1 + period_ret[w]) * (1 - cost)
+    return navs, settlements
+
+
+def run_strategies(context: BacktestContext, trading_days: List[pd.Timestamp],
+                   strategies: List[Strategy],
+                   selection_cache: Optional[SelectionCache] = None) -> Dict[str, StrategyResult]:
+    """
+    同时回测多个策略
+
+    先单次遍历调仓日生成各策略的建仓序列（趋势、全市场stock_data当日只计算一次；
+    选股结果按 (selector, 趋势状态) 在当日内复用，要共享选股流的策略应传入同一个 selector 对象；
+    传入 selection_cache 时，设置了 selection_key 的策略优先读取持久化的选股结果），
+    再由 simulate_windows 对每个策略整段向量化计算逐日净值与每期结果。
+
+    Returns:
+        策略名 -> StrategyResult
+    """
+    panel = context.panel
+    benchmark = context.benchmark
+    holdings = {strategy.name: [] for strategy in strategies}
+
+    for i, today in enumerate(trading_days):
+        rebalancing = [strategy for strategy in strategies if i % strategy.hold_days == 0]
+        if not rebalancing:
+            continue
+        all_stocks = None
+        regimes: Dict[Hashable, object] = {}
+        selections: Dict[Tuple, List[Dict]] = {}
+
+        for strategy in rebalancing:
+            regime = None
+            if strategy.regime is not None:
+                if strategy.regime not in regimes:
+                    regimes[strategy.regime] = strategy.regime(context, today)
+                regime = regimes[strategy.regime]
+
+            key = (strategy.selector, regime)
+            if key not in selections:
+                persistent = selection_cache is not None and strategy.selection_key is not None
+                selected = selection_cache.get(strategy.selection_key, today, regime) if persistent else None
+                if selected is None:
+                    if all_stocks is None:
+                        all_stocks = build_day_stocks(panel, context.stock_codes, today)
+                    # 选股函数会在stock_data上写评分字段，每次选股使用独立副本
+                    selected = strategy.selector([dict(s) for s in all_stocks], regime)
+                    if persistent:
+                        selection_cache.put(strategy.selection_key, today, regime, selected)
+                selections[key] = selected
+            selected = selections[key]
+
+            # 等权建仓
+            window = []
+            if selected:
+                w = 1.0 / len(selected)
+                for s in selected:
+                    window.append((panel.col(s['code']), s['price'], w))
+            holdings[strategy.name].append(window)
+
+    if selection_cache is not None:
+        selection_cache.flush()
+
+    day_rows = np.array([panel.row(d) for d in trading_days], dtype=np.int64)
+    results = {}
+    for strategy in strategies:
+        cost = strategy.cost.round_trip
+        navs, settlements = simulate_windows(panel.close, day_rows, strategy.hold_days,
+                                             holdings[strategy.name], strategy.stop, cost)
+        periods = []
+        for w, period_ret, num_stocks, win_count in settlements:
+            bd = trading_days[w * strategy.hold_days]
+            today = trading_days[(w + 1) * strategy.hold_days]
+            bench_ret = 0
+            if bd in benchmark.index and today in benchmark.index:
+                bench_ret = (benchmark.loc[today]['close'] / benchmark.loc[bd]['close'] - 1) * 100
+            strat_ret_pct = ((1 + period_ret) * (1 - cost) - 1) * 100
+            periods.append({
+                'buy_date': bd.strftime('%Y-%m-%d'),
+                'sell_date': today.strftime('%Y-%m-%d'),
+                'strategy_return': strat_ret_pct,
+                'benchmark_return': bench_ret,
+                'excess_return': strat_ret_pct - bench_ret,
+                'num_stocks': num_stocks,
+                'win_count': win_count,
+            })
+        results[strategy.name] = StrategyResult(strategy.name, navs, periods)
+    return results
@@ -0,0 +1,109 @@
+"""
+回测选股因子预计算
+
+每只股票在自身K线序列上一次性算出全历史的滚动因子
+（动量、量比、波动率、最大回撤），再按日期对齐写入DailyPanel。
+回测中构建某日的stock_data只需按 (row, col) 取值，
+不再对每个调仓日、每只股票重复切片计算。
+
+窗口定义与原 build_stock_data 逐日计算保持一致：
+- 序号 loc 为该股票自身K线中的位置（停牌日不计）
+- 动量/量比/波动率/回撤需要 loc >= 20（5日动量需要 loc >= 5），否则取默认值
+- 量比、波动率使用前20根（不含当日），回撤使用含当日的21根收盘价
+"""
+import warnings
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from src.backtest.panel import DailyPanel
+
+WINDOW = 20
+SHORT_WINDOW = 5
+
+# 因子名 -> 数据不足时的默认值
+FEATURE_DEFAULTS = {
+    'momentum_20d': 0.0,
+    'momentum_5d': 0.0,
+    'volume_ratio': 1.0,
+    'volatility_20d': 0.0,
+    'max_drawdown_20d': 0.0,
+}
+
+
+def _momentum(close: np.ndarray, window: int) -> np.ndarray:
+    """window日动量(%)，前window根为0"""
+    out = np.zeros(len(close))
+    if len(close) > window:
+        out[window:] = (close[window:] / close[:-window] - 1) * 100
+    return out
+
+
+def compute_stock_features(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    计算单只股票全历史的滚动因子
+
+    Args:
+        df: 中文列日线DataFrame（收盘/成交量/涨跌幅，换手率可选）
+
+    Returns:
+        因子名 -> 与df行对齐的一维数组
+    """
+    n = len(df)
+    close = df['收盘'].to_numpy(dtype=np.float64)
+    volume = df['成交量'].to_numpy(dtype=np.float64)
+    change_pct = df['涨跌幅'].to_numpy(dtype=np.float64)
+
+    features = {name: np.full(n, default) for name, default in FEATURE_DEFAULTS.items()}
+    features['momentum_20d'] = _momentum(close, WINDOW)
+    features['momentum_5d'] = _momentum(close, SHORT_WINDOW)
+    features['change_pct'] = change_pct
+    if '换手率' in df.columns:
+        turnover = df['换手率'].to_numpy(dtype=np.float64)
+        features['turnover_rate'] = np.where(np.isnan(turnover), 2.0, turnover)
+    else:
+        features['turnover_rate'] = np.full(n, 2.0)
+
+    if n <= WINDOW:
+        return features
+
+    with warnings.catch_warnings():
+        # 窗口内有效值不足时 nanmean/nanstd 返回NaN，与pandas一致
+        warnings.simplefilter('ignore', RuntimeWarning)
+
+        # 量比：当日成交量 / 前20日平均成交量
+        avg_vol = np.nanmean(sliding_window_view(volume[:-1], WINDOW), axis=1)
+        ratio = np.full(len(avg_vol), 1.0)
+        positive = avg_vol > 0
+        ratio[positive] = volume[WINDOW:][positive] / avg_vol[positive]
+        features['volume_ratio'][WINDOW:] = ratio
+
+        # 20日波动率：前20日涨跌幅的样本标准差
+        features['volatility_20d'][WINDOW:] = np.nanstd(
+            sliding_window_view(change_pct[:-1], WINDOW), axis=1, ddof=1)
+
+        # 20日最大回撤：含当日21根收盘价，相对窗口内累计最高点
+        windows = sliding_window_view(close, WINDOW + 1)
+        cummax = np.fmax.accumulate(windows, axis=1)
+        features['max_drawdown_20d'][WINDOW:] = np.nanmin((windows - cummax) / cummax * 100, axis=1)
+
+    return features
+
+
+def add_features(panel: DailyPanel, daily_data: Dict[str, pd.DataFrame]) -> DailyPanel:
+    """计算所有股票的因子并按日期对齐写入面板（无K线的位置为NaN）"""
+    n_dates, n_codes = panel.shape
+    fields = {}
+    for code, df in daily_data.items():
+        j = panel.col(code)
+        if j is None or df.empty:
+            continue
+        rows = panel.dates.get_indexer(df.index)
+        for name, values in compute_stock_features(df).items():
+            if name not in fields:
+                fields[name] = np.full((n_dates, n_codes), np.nan)
+            fields[name][rows, j] = values
+    panel.add_fields(fields)
+    return panel
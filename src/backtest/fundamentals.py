@@ -0,0 +1,73 @@
+"""
+按时点对齐的财报字段
+
+把 {code: {报告期: 财报字段}} 展开为与行情面板对齐的 日期 × 股票 数组：
+每个交易日取当时已公布的最新报告期（口径同 simulation.get_report_date），
+报告期之间的交易日沿用同一期数据；PE/PB 按收盘价整表向量化计算。
+回测构建某日的stock_data只需读取面板的一行，不再逐只股票解析日期、查嵌套字典。
+缺失（该股票没有该期财报或字段为空）为NaN。
+"""
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from src.backtest.panel import DailyPanel
+
+FIN_FIELDS = ('roe', 'profit_growth', 'eps', 'bvps')
+# 写入面板的字段：财报原始字段 + 估值
+PANEL_FIELDS = FIN_FIELDS + ('pe_ratio', 'pb_ratio')
+
+
+def report_dates_for(dates: pd.DatetimeIndex) -> np.ndarray:
+    """
+    各交易日已公布的最新报告期（YYYYMMDD字符串数组）
+
+    1-4月: 上年三季报；5-8月: 一季报；9-10月: 半年报；11-12月: 三季报
+    """
+    dates = pd.DatetimeIndex(dates)
+    year = dates.year.to_numpy()
+    month = dates.month.to_numpy()
+    year = np.where(month <= 4, year - 1, year)
+    quarter = np.select([month <= 4, month <= 8, month <= 10], ['0930', '0331', '0630'], '0930')
+    return np.char.add(year.astype(str), quarter)
+
+
+def point_in_time_fields(panel: DailyPanel, fin_data: Dict) -> Dict[str, np.ndarray]:
+    """
+    财报字段与PE/PB的 日期 × 股票 数组（与panel对齐）
+
+    PE/PB 仅在每股收益/每股净资产为正时有值，否则为NaN
+    """
+    day_reports = report_dates_for(panel.dates)
+    report_dates, day_index = np.unique(day_reports, return_inverse=True)
+    report_row = {rd: i for i, rd in enumerate(report_dates)}
+
+    # 报告期 × 股票，再按交易日展开
+    shape = (len(report_dates), len(panel.codes))
+    by_report = {field: np.full(shape, np.nan) for field in FIN_FIELDS}
+    for code, reports in fin_data.items():
+        j = panel.col(code)
+        if j is None:
+            continue
+        for rd, fin in reports.items():
+            i = report_row.get(rd)
+            if i is None:
+                continue
+            for field in FIN_FIELDS:
+                if fin.get(field) is not None:
+                    by_report[field][i, j] = fin[field]
+
+    arrays = {field: arr[day_index] for field, arr in by_report.items()}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        arrays['pe_ratio'] = np.where(arrays['eps'] > 0, panel.close / arrays['eps'], np.nan)
+        arrays['pb_ratio'] = np.where(arrays['bvps'] > 0, panel.close / arrays['bvps'], np.nan)
+    return arrays
+
+
+def add_fundamentals(panel: DailyPanel, fin_data: Dict) -> DailyPanel:
+    """把按时点对齐的财报字段写入面板（已存在时跳过，如工作进程挂载的共享面板）"""
+    if all(field in panel.arrays for field in PANEL_FIELDS):
+        return panel
+    panel.add_fields(point_in_time_fields(panel, fin_data))
+    return panel
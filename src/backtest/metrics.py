@@ -0,0 +1,132 @@
+"""
+流式绩效指标
+
+逐点输入净值（可同时输入基准收盘价/净值），在线维护运行峰值、最大回撤、
+日收益均值/方差（Welford算法，用于夏普比率）和基准起止值（用于超额收益），
+另可逐期累计胜率。长回测/参数扫描无需保存或反复遍历整条净值序列。
+"""
+import math
+from typing import Dict, Iterable, List, Optional
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+class MetricsAccumulator:
+    """在线累计的净值指标，收益/回撤以小数表示（0.1 = 10%）"""
+
+    def __init__(self, periods_per_year: int = TRADING_DAYS_PER_YEAR):
+        self.periods_per_year = periods_per_year
+        self.count = 0
+        self.first = None
+        self.last = None
+        self.peak = None
+        self.drawdown = 0.0       # 当前回撤
+        self.max_drawdown = 0.0
+        # 日收益的Welford统计量
+        self._n_returns = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        # 基准
+        self.bench_first = None
+        self.bench_last = None
+        # 逐期胜率
+        self.wins = 0
+        self.trades = 0
+
+    def update(self, nav: float, bench: Optional[float] = None) -> 'MetricsAccumulator':
+        """输入一个净值点（bench为同日基准收盘价或净值，缺失时传None）"""
+        if self.count == 0:
+            self.first = self.peak = nav
+        else:
+            ret = nav / self.last - 1
+            self._n_returns += 1
+            delta = ret - self._mean
+            self._mean += delta / self._n_returns
+            self._m2 += delta * (ret - self._mean)
+        self.count += 1
+        self.last = nav
+        self.peak = max(self.peak, nav)
+        self.drawdown = (self.peak - nav) / self.peak
+        self.max_drawdown = max(self.max_drawdown, self.drawdown)
+
+        if bench is not None:
+            if self.bench_first is None:
+                self.bench_first = bench
+            self.bench_last = bench
+        return self
+
+    def update_many(self, navs: Iterable[float]) -> 'MetricsAccumulator':
+        for nav in navs:
+            self.update(nav)
+        return self
+
+    def add_period(self, win_count: int, num_stocks: int):
+        """累计一期的盈利笔数和交易笔数"""
+        self.wins += win_count
+        self.trades += num_stocks
+
+    @property
+    def total_return(self) -> float:
+        return self.last / self.first - 1 if self.count else 0.0
+
+    @property
+    def benchmark_return(self) -> Optional[float]:
+        if self.bench_first is None:
+            return None
+        return self.bench_last / self.bench_first - 1
+
+    @property
+    def excess_return(self) -> Optional[float]:
+        bench = self.benchmark_return
+        return None if bench is None else self.total_return - bench
+
+    @property
+    def volatility(self) -> float:
+        """年化波动率"""
+        if self._n_returns < 2:
+            return 0.0
+        return math.sqrt(self._m2 / (self._n_returns - 1) * self.periods_per_year)
+
+    @property
+    def sharpe(self) -> float:
+        """年化夏普比率（无风险利率按0）"""
+        vol = self.volatility
+        return self._mean * self.periods_per_year / vol if vol > 0 else 0.0
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.trades if self.trades else 0.0
+
+    def summary(self) -> Dict:
+        """汇总指标（收益/回撤/胜率单位%）"""
+        bench = self.benchmark_return
+        return {
+            'total_return': self.total_return * 100,
+            'max_drawdown': self.max_drawdown * 100,
+            'sharpe': self.sharpe,
+            'volatility': self.volatility * 100,
+            'win_rate': self.win_rate * 100,
+            'benchmark_return': None if bench is None else bench * 100,
+            'excess_return': None if bench is None else self.excess_return * 100,
+        }
+
+
+def period_accumulator(results: List[Dict], periods_per_year: int = TRADING_DAYS_PER_YEAR) -> MetricsAccumulator:
+    """
+    按每期结果复利累计（起点1.0计入峰值），同时累计胜率
+
+    无逐日净值时用于回撤；periods_per_year 按持仓周期折算（如 252 // hold_days）后夏普比率才有意义
+    """
+    acc = MetricsAccumulator(periods_per_year)
+    acc.update(1.0)
+    cum = 1.0
+    for r in results:
+        cum *= (1 + r['strategy_return'] / 100)
+        acc.update(cum)
+        acc.add_period(r['win_count'], r['num_stocks'])
+    return acc
+
+
+def max_drawdown(navs: Iterable[float]) -> float:
+    """净值序列的最大回撤（小数）"""
+    return MetricsAccumulator().update_many(navs).max_drawdown
@@ -0,0 +1,102 @@
+"""
+回测行情面板：日期 × 股票 对齐的二维数组
+
+回测循环按整数下标读取价格（panel.close[row, col]），
+替代 daily_data[code].loc[date]['收盘'] 的pandas标签查找。
+停牌等缺失数据为NaN。
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 面板字段 -> 日线DataFrame中文列名
+FIELD_COLUMNS = {
+    'open': '开盘',
+    'close': '收盘',
+    'high': '最高',
+    'low': '最低',
+    'volume': '成交量',
+}
+
+
+class DailyPanel:
+    """日期 × 股票 的对齐日线面板"""
+
+    def __init__(self, dates: pd.DatetimeIndex, codes: List[str], arrays: Dict[str, np.ndarray]):
+        """
+        Args:
+            dates: 交易日索引（升序）
+            codes: 股票代码列表（列顺序）
+            arrays: 字段名 -> shape为(len(dates), len(codes))的float64数组
+        """
+        self.dates = pd.DatetimeIndex(dates)
+        self.codes = list(codes)
+        self.code_index = {code: i for i, code in enumerate(self.codes)}
+        self.date_index = {d: i for i, d in enumerate(self.dates)}
+        self.arrays = arrays
+        for field, arr in arrays.items():
+            setattr(self, field, arr)
+
+    @classmethod
+    def from_daily_data(cls, daily_data: Dict[str, pd.DataFrame]) -> 'DailyPanel':
+        """由 {code: 中文列日线DataFrame} 构建面板，列顺序与输入字典一致"""
+        codes = list(daily_data.keys())
+        if not codes:
+            return cls(pd.DatetimeIndex([]), [], {f: np.empty((0, 0)) for f in FIELD_COLUMNS})
+
+        dates = daily_data[codes[0]].index
+        for code in codes[1:]:
+            dates = dates.union(daily_data[code].index)
+        dates = pd.DatetimeIndex(dates).sort_values()
+
+        arrays = {f: np.full((len(dates), len(codes)), np.nan) for f in FIELD_COLUMNS}
+        for j, code in enumerate(codes):
+            df = daily_data[code]
+            rows = dates.get_indexer(df.index)
+            for field, column in FIELD_COLUMNS.items():
+                arrays[field][rows, j] = df[column].to_numpy(dtype=np.float64)
+        return cls(dates, codes, arrays)
+
+    def add_fields(self, arrays: Dict[str, np.ndarray]):
+        """追加与面板对齐的字段（如预计算因子），可通过属性访问"""
+        for field, arr in arrays.items():
+            if arr.shape != self.shape:
+                raise ValueError(f"字段 {field} 形状 {arr.shape} 与面板 {self.shape} 不一致")
+            self.arrays[field] = arr
+            setattr(self, field, arr)
+
+    def to_cache(self, cache, key: str, **meta):
+        """写入内存映射数组缓存（src.data.array_cache.ArrayCache），meta为附加的JSON元数据"""
+        index = {
+            'dates': [d.strftime('%Y-%m-%d') for d in self.dates],
+            'codes': self.codes,
+            **meta,
+        }
+        cache.save(key, self.arrays, index)
+
+    @classmethod
+    def from_cache(cls, cache, key: str) -> Optional[Tuple['DailyPanel', Dict]]:
+        """以内存映射方式打开缓存的面板，返回 (面板, 索引元数据)，不存在返回None"""
+        cached = cache.load(key)
+        if cached is None:
+            return None
+        index, arrays = cached
+        return cls(pd.to_datetime(index['dates']), index['codes'], arrays), index
+
+    @property
+    def shape(self):
+        return len(self.dates), len(self.codes)
+
+    def row(self, date) -> Optional[int]:
+        """交易日对应的行号，不存在返回None"""
+        return self.date_index.get(pd.Timestamp(date))
+
+    def col(self, code: str) -> Optional[int]:
+        """股票代码对应的列号，不存在返回None"""
+        return self.code_index.get(code)
+
+    def stock_dates(self, code: str) -> pd.DatetimeIndex:
+        """某只股票有数据的交易日"""
+        j = self.code_index[code]
+        return self.dates[~np.isnan(self.close[:, j])]
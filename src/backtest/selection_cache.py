@@ -0,0 +1,105 @@
+"""
+选股结果持久化缓存
+
+回测中某个调仓日的选股结果只取决于行情面板/财报（数据版本）、趋势状态和评分参数，
+与交易成本、止损规则无关。缓存按 (选股参数指纹, 数据版本) 分文件保存：
+    <root>/<sha1>.json    {"YYYY-MM-DD|趋势状态": [[code, price], ...]}
+只改成本或止损重新回测时，调仓日直接读取选股结果，跳过构建stock_data和评分。
+选股逻辑本身（代码）变化时需递增 CACHE_VERSION 使旧缓存失效。
+参数扫描/滚动窗口的多个工作进程共用缓存目录：写回时在文件锁内先合并磁盘上的现有内容，
+各进程新增的结果不会互相覆盖。
+"""
+import hashlib
+import json
+import logging
+import os
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows：无文件锁，合并后替换仍只会在并发写回的极短窗口内丢失结果
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+
+class SelectionCache:
+    """按 (selection_key, 日期, 趋势状态) 存取选股结果"""
+
+    def __init__(self, root: str, data_version: str):
+        self.root = root
+        self.data_version = data_version
+        self._entries: Dict[str, Dict[str, List]] = {}  # selection_key -> 缓存内容
+        self._dirty = set()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, selection_key: str) -> str:
+        digest = hashlib.sha1(f'{CACHE_VERSION}|{selection_key}|{self.data_version}'.encode()).hexdigest()
+        return os.path.join(self.root, f'{digest}.json')
+
+    @staticmethod
+    def _read(path: str) -> Dict[str, List]:
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"读取选股缓存失败: {e}")
+            return {}
+
+    def _load(self, selection_key: str) -> Dict[str, List]:
+        if selection_key not in self._entries:
+            self._entries[selection_key] = self._read(self._path(selection_key))
+        return self._entries[selection_key]
+
+    @staticmethod
+    @contextmanager
+    def _file_lock(path: str):
+        """跨进程独占锁（<path>.lock）"""
+        if fcntl is None:
+            yield
+            return
+        with open(f'{path}.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _entry_key(date, regime) -> str:
+        return f"{date.strftime('%Y-%m-%d')}|{regime}"
+
+    def get(self, selection_key: str, date, regime) -> Optional[List[Dict]]:
+        """命中返回 [{'code', 'price'}]，未命中返回None"""
+        selected = self._load(selection_key).get(self._entry_key(date, regime))
+        if selected is None:
+            return None
+        return [{'code': code, 'price': price} for code, price in selected]
+
+    def put(self, selection_key: str, date, regime, selected: List[Dict]):
+        self._load(selection_key)[self._entry_key(date, regime)] = [
+            [s['code'], float(s['price'])] for s in selected
+        ]
+        self._dirty.add(selection_key)
+
+    def flush(self):
+        """写回有新增结果的缓存文件：文件锁内与磁盘上其他进程写入的结果合并后原子替换"""
+        for selection_key in self._dirty:
+            path = self._path(selection_key)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            try:
+                with self._file_lock(path):
+                    merged = self._read(path)
+                    merged.update(self._entries[selection_key])
+                    with open(tmp_path, 'w', encoding='utf-8') as f:
+                        json.dump(merged, f, ensure_ascii=False)
+                    os.replace(tmp_path, path)
+                self._entries[selection_key] = merged
+            except Exception as e:
+                logger.warning(f"保存选股缓存失败: {e}")
+        self._dirty.clear()
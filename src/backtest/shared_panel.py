@@ -0,0 +1,75 @@
+"""
+共享内存行情面板
+
+主进程把 DailyPanel 的全部字段数组复制到一块 multiprocessing.shared_memory，
+工作进程按描述信息（spec）挂载为只读 numpy 视图，不复制数据。
+N 个工作进程只占用一份面板内存，进程启动时也无需序列化整张面板。
+"""
+from multiprocessing import shared_memory
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.backtest.panel import DailyPanel
+
+_ALIGN = 64  # 各字段起始偏移按缓存行对齐
+
+
+class SharedPanel:
+    """
+    发布到共享内存的面板（由创建方负责释放）
+
+    用法:
+        with SharedPanel(panel) as shared:
+            ...  # 把 shared.spec 传给工作进程，工作进程调用 attach_panel(spec)
+    """
+
+    def __init__(self, panel: DailyPanel):
+        layout = []
+        offset = 0
+        for field, arr in panel.arrays.items():
+            arr = np.ascontiguousarray(arr, dtype=np.float64)
+            layout.append((field, offset, arr))
+            offset += -(-arr.nbytes // _ALIGN) * _ALIGN
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for field, start, arr in layout:
+            view = np.ndarray(arr.shape, dtype=np.float64, buffer=self.shm.buf, offset=start)
+            view[...] = arr
+
+        self.spec = {
+            'name': self.shm.name,
+            'shape': panel.shape,
+            'dates': panel.dates.values.astype('datetime64[ns]').view(np.int64),
+            'codes': list(panel.codes),
+            'fields': [(field, start) for field, start, _ in layout],
+        }
+
+    def close(self):
+        """关闭并删除共享内存（工作进程全部结束后调用）"""
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self) -> 'SharedPanel':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach_panel(spec: Dict) -> Tuple[DailyPanel, shared_memory.SharedMemory]:
+    """
+    按 spec 挂载共享内存面板（只读视图）
+
+    Returns:
+        (面板, 共享内存句柄)，调用方需持有句柄直到不再使用面板
+    """
+    shm = shared_memory.SharedMemory(name=spec['name'])
+    arrays = {}
+    for field, start in spec['fields']:
+        arr = np.ndarray(spec['shape'], dtype=np.float64, buffer=shm.buf, offset=start)
+        arr.flags.writeable = False
+        arrays[field] = arr
+    dates = pd.DatetimeIndex(spec['dates'].view('datetime64[ns]'))
+    return DailyPanel(dates, spec['codes'], arrays), shm
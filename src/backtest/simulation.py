@@ -0,0 +1,187 @@
+"""
+回测模拟核心
+
+逐日模拟：MA60攻防切换 + 单只止损 + 止损后剩余仓位继续持有，按持仓周期调仓。
+run_backtest_optimized.py 与参数扫描共用同一份实现，逐日循环由 engine.run_strategies 执行。
+"""
+import hashlib
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.analysis.regime import RegimeSeries
+from src.analysis.stock_filter import StockFilter
+from src.backtest.fundamentals import add_fundamentals
+from src.backtest.metrics import MetricsAccumulator, period_accumulator
+from src.backtest.panel import DailyPanel
+
+
+@dataclass
+class BacktestContext:
+    """一次数据加载后各回测场景共享的只读数据"""
+    panel: DailyPanel              # 已写入因子的行情面板（构造时补充按时点对齐的财报字段）
+    fin_data: Dict                 # {code: {报告期: 财报字段}}
+    benchmark: pd.DataFrame        # 沪深300日线（date索引，close列）
+    stock_codes: List[str]         # 股票池（决定选股时的遍历顺序）
+    regime: Optional[RegimeSeries] = None  # 预计算的MA60趋势序列，未提供时由benchmark计算
+
+    def __post_init__(self):
+        # 财报字段按交易日对齐写入面板，选股时与因子一起按行读取
+        # （发往工作进程的上下文不带面板，由共享内存挂载，见 sweep.map_shared）
+        if self.panel is not None:
+            add_fundamentals(self.panel, self.fin_data)
+
+    def regime_series(self) -> RegimeSeries:
+        if self.regime is None:
+            self.regime = RegimeSeries.from_close(self.benchmark['close'])
+        return self.regime
+
+    def trading_days(self, start: str, end: str) -> List[pd.Timestamp]:
+        """回测区间内的交易日（以面板第一只股票的K线日期为准）"""
+        days = self.panel.stock_dates(self.panel.codes[0])
+        return days[(days >= start) & (days <= end)].tolist()
+
+    def data_version(self) -> str:
+        """回测数据（面板、财报、基准、股票池）的内容指纹，数据变化时随之变化"""
+        h = hashlib.sha1()
+        h.update(json.dumps(list(self.stock_codes)).encode())
+        h.update(self.panel.dates.values.astype('datetime64[ns]').tobytes())
+        h.update(json.dumps(list(self.panel.codes)).encode())
+        for field in sorted(self.panel.arrays):
+            h.update(field.encode())
+            h.update(np.ascontiguousarray(self.panel.arrays[field]).tobytes())
+        h.update(json.dumps(self.fin_data, sort_keys=True, default=repr).encode())
+        h.update(self.benchmark.index.values.astype('datetime64[ns]').tobytes())
+        h.update(np.ascontiguousarray(self.benchmark['close'].to_numpy(dtype=np.float64)).tobytes())
+        return h.hexdigest()
+
+
+def get_report_date(trade_date: str) -> str:
+    """根据交易日期确定当时已公布的最新财报期（按交易日批量计算见 fundamentals.report_dates_for）"""
+    dt = datetime.strptime(trade_date, '%Y-%m-%d')
+    y = dt.year
+    m = dt.month
+    if m <= 4:
+        return f'{y-1}0930'
+    elif m <= 8:
+        return f'{y}0331'
+    elif m <= 10:
+        return f'{y}0630'
+    else:
+        return f'{y}0930'
+
+
+# stock_data中直接取自面板的数值字段（缺失值保持NaN）与财报字段（缺失为None）
+_FACTOR_FIELDS = ('change_pct', 'turnover_rate', 'momentum_20d', 'momentum_5d', 'volume_ratio',
+                  'volatility_20d', 'max_drawdown_20d')
+_OPTIONAL_FIELDS = ('pe_ratio', 'pb_ratio', 'roe', 'profit_growth')
+
+
+def build_day_stocks(panel: DailyPanel, codes: List[str], trade_date) -> List[Dict]:
+    """
+    构建某个交易日全部股票的stock_data字典（按codes顺序，跳过面板中没有或当日无价格的股票）
+
+    因子与按时点对齐的财报字段均取自面板同一行（见 fundamentals.add_fundamentals）
+    """
+    row = panel.row(trade_date)
+    if row is None:
+        return []
+    pairs = [(code, panel.col(code)) for code in codes]
+    pairs = [(code, col) for code, col in pairs if col is not None]
+    cols = np.array([col for _, col in pairs], dtype=np.int64)
+    prices = panel.close[row, cols].tolist()
+    factors = {field: panel.arrays[field][row, cols].tolist() for field in _FACTOR_FIELDS}
+    optional = {field: panel.arrays[field][row, cols].tolist() for field in _OPTIONAL_FIELDS}
+
+    stocks = []
+    for k, (code, _) in enumerate(pairs):
+        price = prices[k]
+        if price != price:  # NaN：停牌/未上市
+            continue
+        fin = {field: None if values[k] != values[k] else values[k] for field, values in optional.items()}
+        stocks.append({
+            'code': code,
+            'name': code,
+            'price': price,
+            'change_pct': factors['change_pct'][k],
+            'turnover_rate': factors['turnover_rate'][k],
+            'momentum_20d': factors['momentum_20d'][k],
+            'momentum_5d': factors['momentum_5d'][k],
+            'volume_ratio': factors['volume_ratio'][k],
+            'volatility_20d': factors['volatility_20d'][k],
+            'max_drawdown_20d': factors['max_drawdown_20d'][k],
+            'pe_ratio': fin['pe_ratio'],
+            'pb_ratio': fin['pb_ratio'],
+            'roe': fin['roe'],
+            'profit_growth': fin['profit_growth'],
+            'dividend_yield': None,
+        })
+    return stocks
+
+
+def build_stock_data(code, panel, trade_date):
+    """为某只股票在某个交易日构建完整的stock_data字典（因子与财报均取自面板）"""
+    stocks = build_day_stocks(panel, [code], trade_date)
+    return stocks[0] if stocks else None
+
+
+def is_bull_market(benchmark: pd.DataFrame, today) -> bool:
+    """MA60趋势判断：当日收盘价高于此前60日均线（逐日计算版，回测使用 RegimeSeries 的预计算结果）"""
+    if today not in benchmark.index:
+        return False
+    loc = benchmark.index.get_loc(today)
+    if loc < 60:
+        return False
+    ma60 = benchmark.iloc[loc-60:loc]['close'].mean()
+    cur = float(benchmark.loc[today]['close'])
+    return cur > ma60
+
+
+def simulate(context: BacktestContext, trading_days: List[pd.Timestamp], hold_days: int = 7,
+             cost_buy: float = 0.001, cost_sell: float = 0.0015, stop_loss_pct: float = -0.05,
+             stock_filter: Optional[StockFilter] = None,
+             selection_cache=None) -> Tuple[List[Dict], List[float]]:
+    """
+    逐日模拟回测
+
+    Args:
+        selection_cache: SelectionCache，传入时复用按筛选参数缓存的选股结果
+            （只改成本/止损的重复回测不再选股）
+
+    Returns:
+        (每期结果列表, 逐日净值列表)
+    """
+    # 引擎依赖本模块的 BacktestContext / build_stock_data，在函数内导入避免循环引用
+    from src.backtest.engine import CostModel, RealStop, Strategy, regime_selector, run_strategies
+
+    stock_filter = stock_filter or StockFilter()
+    strategy = Strategy(
+        name='default',
+        selector=regime_selector(stock_filter.select_top_stocks_offensive,
+                                 stock_filter.select_top_stocks_ultra_defensive),
+        stop=RealStop(stop_loss_pct),
+        cost=CostModel(cost_buy, cost_sell),
+        hold_days=hold_days,
+        selection_key=f'stock_filter:{stock_filter.fingerprint()}',
+    )
+    result = run_strategies(context, trading_days, [strategy], selection_cache)['default']
+    return result.periods, result.navs
+
+
+def summarize(results: List[Dict], daily_navs: Optional[List[float]] = None) -> Dict:
+    """回测汇总指标：累计收益(%)、最大回撤(%)、夏普比率、胜率(%)，口径与 print_results 一致"""
+    periods = period_accumulator(results)
+    # 最大回撤/夏普优先用逐日净值，否则按每期复利净值计算回撤
+    daily = MetricsAccumulator().update_many(daily_navs) if daily_navs and len(daily_navs) > 1 else None
+    return {
+        'total_return': periods.total_return * 100,
+        'max_drawdown': (daily or periods).max_drawdown * 100,
+        'sharpe': daily.sharpe if daily else 0.0,
+        'win_rate': periods.win_rate * 100,
+        'periods': len(results),
+        'trades': periods.trades,
+    }
@@ -0,0 +1,136 @@
+"""
+参数扫描
+
+对 BACKTEST_PARAMS / STOCK_FILTER_CONFIG 中的参数做网格组合，
+每个组合独立回测，进程池并行执行（map_shared，滚动窗口回测共用）。行情面板等数据只加载一次：
+面板发布到共享内存，各工作进程零拷贝挂载；财报、基准等小数据在进程初始化时传入。
+"""
+import dataclasses
+import itertools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from config.backtest_config import BACKTEST_PARAMS
+from config.config import STOCK_FILTER_CONFIG
+from src.analysis.stock_filter import StockFilter
+from src.backtest.selection_cache import SelectionCache
+from src.backtest.shared_panel import SharedPanel, attach_panel
+from src.backtest.simulation import BacktestContext, simulate, summarize
+
+logger = logging.getLogger(__name__)
+
+RESULT_COLUMNS = ['total_return', 'max_drawdown', 'sharpe', 'win_rate', 'periods', 'trades']
+
+# 工作进程内的共享数据（由 _init_worker 设置）
+_context: Optional[BacktestContext] = None
+_shm = None  # 持有共享内存句柄，保证面板视图有效
+_selection_cache: Optional[SelectionCache] = None
+
+
+def expand_grid(grid: Dict[str, List]) -> List[Dict]:
+    """参数网格 -> 参数组合列表（按键的顺序做笛卡尔积）"""
+    keys = list(grid.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def split_params(combo: Dict) -> Tuple[Dict, Dict]:
+    """
+    把一个参数组合拆分为 (回测参数, 筛选参数)，未指定的取默认配置
+
+    Raises:
+        ValueError: 参数名不属于 BACKTEST_PARAMS 或 STOCK_FILTER_CONFIG
+    """
+    params = dict(BACKTEST_PARAMS)
+    config = dict(STOCK_FILTER_CONFIG)
+    for key, value in combo.items():
+        if key in BACKTEST_PARAMS:
+            params[key] = value
+        elif key in STOCK_FILTER_CONFIG:
+            config[key] = value
+        else:
+            raise ValueError(f"未知的扫描参数: {key}")
+    return params, config
+
+
+def date_range(grid: Dict[str, List]) -> Tuple[str, str]:
+    """网格中所有组合覆盖的回测区间（用于一次性加载数据）"""
+    starts = grid.get('start_date', [BACKTEST_PARAMS['start_date']])
+    ends = grid.get('end_date', [BACKTEST_PARAMS['end_date']])
+    return min(starts), max(ends)
+
+
+def run_scenario(context: BacktestContext, combo: Dict,
+                 selection_cache: Optional[SelectionCache] = None) -> Dict:
+    """回测单个参数组合，返回 参数 + 汇总指标"""
+    params, config = split_params(combo)
+    trading_days = context.trading_days(params['start_date'], params['end_date'])
+    results, daily_navs = simulate(
+        context, trading_days, params['hold_days'], params['cost_buy'], params['cost_sell'],
+        stop_loss_pct=config['stop_loss_pct'], stock_filter=StockFilter(config),
+        selection_cache=selection_cache,
+    )
+    return {**combo, **summarize(results, daily_navs)}
+
+
+def _init_worker(context: BacktestContext, panel_spec: Dict, cache_args: Optional[Tuple[str, str]]):
+    global _context, _shm, _selection_cache
+    panel, _shm = attach_panel(panel_spec)
+    _context = dataclasses.replace(context, panel=panel)
+    _selection_cache = SelectionCache(*cache_args) if cache_args else None
+    logging.disable(logging.INFO)  # 避免各进程重复输出选股日志
+
+
+def _run_in_worker(task: Tuple[Callable, object]):
+    func, item = task
+    return func(_context, item, _selection_cache)
+
+
+def map_shared(context: BacktestContext, func: Callable, items: List, max_workers: Optional[int] = None,
+               selection_cache_dir: Optional[str] = None) -> List:
+    """
+    在进程池中对每个 item 执行 func(context, item, selection_cache)，按输入顺序返回结果
+
+    面板放入共享内存，各工作进程零拷贝挂载；func 需为模块级函数（可序列化）。
+    只有一个进程时在当前进程中顺序执行。
+    """
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(items)))
+    cache_args = (selection_cache_dir, context.data_version()) if selection_cache_dir else None
+    logger.info(f"并行回测: {len(items)}个任务, {workers}个进程")
+
+    if workers == 1:
+        selection_cache = SelectionCache(*cache_args) if cache_args else None
+        return [func(context, item, selection_cache) for item in items]
+
+    # 传给工作进程的上下文不再携带面板数组
+    with SharedPanel(context.panel) as shared:
+        worker_context = dataclasses.replace(context, panel=None)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(worker_context, shared.spec, cache_args)) as executor:
+            return list(executor.map(_run_in_worker, [(func, item) for item in items]))
+
+
+def run_sweep(context: BacktestContext, grid: Dict[str, List],
+              max_workers: Optional[int] = None,
+              selection_cache_dir: Optional[str] = None) -> pd.DataFrame:
+    """
+    并行执行参数扫描
+
+    Args:
+        context: 共享回测数据
+        grid: {参数名: 取值列表}，参数名取自 BACKTEST_PARAMS / STOCK_FILTER_CONFIG
+        max_workers: 进程数，默认CPU核数
+        selection_cache_dir: 选股结果缓存目录，只有止损/成本/持仓周期不同的组合复用同一份选股
+
+    Returns:
+        每个组合一行的结果表（参数列 + total_return/max_drawdown/win_rate/periods/trades）
+    """
+    combos = expand_grid(grid)
+    for combo in combos:
+        split_params(combo)  # 提前校验参数名
+    logger.info(f"参数扫描: {len(combos)}个组合")
+    rows = map_shared(context, run_scenario, combos, max_workers, selection_cache_dir)
+    return pd.DataFrame(rows, columns=list(grid.keys()) + RESULT_COLUMNS)
@@ -0,0 +1,134 @@
+"""
+滚动窗口（walk-forward）回测
+
+把回测区间切分为滚动的 训练/测试 窗口：每个折在训练窗口上对参数网格逐一回测，
+按目标指标选出最优参数，再用该参数回测紧随其后的测试窗口（样本外）。
+各折在进程池中并行执行，共享同一份内存中的行情面板（见 sweep.map_shared）。
+"""
+import logging
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from src.backtest.selection_cache import SelectionCache
+from src.backtest.simulation import BacktestContext
+from src.backtest.sweep import RESULT_COLUMNS, expand_grid, map_shared, run_scenario, split_params
+
+logger = logging.getLogger(__name__)
+
+# 可用的选参指标及方向：1 越大越好，-1 越小越好（期数/笔数不是优劣指标）
+OBJECTIVES = {'total_return': 1, 'sharpe': 1, 'win_rate': 1, 'max_drawdown': -1}
+
+
+def make_folds(start: str, end: str, train_months: int, test_months: int,
+               step_months: Optional[int] = None) -> List[Dict]:
+    """
+    切分滚动窗口
+
+    Args:
+        train_months: 训练窗口月数（0表示不做参数选择，只按默认参数滚动回测）
+        test_months: 测试窗口月数
+        step_months: 窗口滚动步长，默认等于测试窗口（测试窗口首尾相接）
+
+    Returns:
+        [{'fold', 'train_start', 'train_end', 'test_start', 'test_end'}]，日期格式YYYY-MM-DD
+    """
+    step = pd.DateOffset(months=step_months or test_months)
+    train = pd.DateOffset(months=train_months)
+    test = pd.DateOffset(months=test_months)
+    one_day = pd.Timedelta(days=1)
+    start_ts, end_ts = pd.Timestamp(start), pd.Timestamp(end)
+
+    folds = []
+    train_start = start_ts
+    while True:
+        test_start = train_start + train
+        test_end = test_start + test - one_day
+        if test_end > end_ts:
+            break
+        folds.append({
+            'fold': len(folds),
+            'train_start': train_start.strftime('%Y-%m-%d'),
+            'train_end': (test_start - one_day).strftime('%Y-%m-%d'),
+            'test_start': test_start.strftime('%Y-%m-%d'),
+            'test_end': test_end.strftime('%Y-%m-%d'),
+        })
+        train_start = train_start + step
+    return folds
+
+
+def run_fold(context: BacktestContext, task: Dict,
+             selection_cache: Optional[SelectionCache] = None) -> Dict:
+    """
+    执行单个折：训练窗口选参数，测试窗口样本外回测
+
+    Args:
+        task: make_folds 的一项，附加 'grid'（参数网格）和 'objective'（选参指标）
+
+    Returns:
+        折信息 + 最优参数 + 训练窗口指标(train_前缀) + 测试窗口指标
+    """
+    fold = {k: task[k] for k in ('fold', 'train_start', 'train_end', 'test_start', 'test_end')}
+    grid, objective = task['grid'], task['objective']
+    sign = OBJECTIVES[objective]
+
+    best, best_train = {}, {}
+    combos = expand_grid(grid) if grid and fold['train_start'] < fold['train_end'] else []
+    for combo in combos:
+        row = run_scenario(context, {**combo, 'start_date': fold['train_start'],
+                                     'end_date': fold['train_end']}, selection_cache)
+        if not best_train or sign * row[objective] > sign * best_train[objective]:
+            best, best_train = combo, row
+
+    test = run_scenario(context, {**best, 'start_date': fold['test_start'],
+                                  'end_date': fold['test_end']}, selection_cache)
+    return {
+        **fold,
+        **best,
+        **{f'train_{k}': best_train.get(k) for k in ('total_return', 'max_drawdown')},
+        **{k: test[k] for k in RESULT_COLUMNS},
+    }
+
+
+def run_walk_forward(context: BacktestContext, folds: List[Dict], grid: Optional[Dict[str, List]] = None,
+                     objective: str = 'total_return', max_workers: Optional[int] = None,
+                     selection_cache_dir: Optional[str] = None) -> pd.DataFrame:
+    """
+    并行执行滚动窗口回测
+
+    Args:
+        folds: make_folds 的结果
+        grid: 训练窗口上的参数网格（同 SWEEP_GRID），为空时各折使用默认参数
+        objective: 选参指标（OBJECTIVES 之一，最大回撤取最小，其余取最大）
+        max_workers: 进程数，默认CPU核数
+
+    Returns:
+        每折一行：折区间 + 最优参数 + 训练/测试指标
+    """
+    grid = grid or {}
+    if objective not in OBJECTIVES:
+        raise ValueError(f"未知的选参指标: {objective}")
+    for combo in expand_grid(grid):
+        split_params(combo)  # 提前校验参数名
+    logger.info(f"滚动窗口回测: {len(folds)}折, 每折{len(expand_grid(grid)) if grid else 0}个参数组合")
+
+    tasks = [{**fold, 'grid': grid, 'objective': objective} for fold in folds]
+    rows = map_shared(context, run_fold, tasks, max_workers, selection_cache_dir)
+    return pd.DataFrame(rows)
+
+
+def summarize_folds(table: pd.DataFrame) -> Dict:
+    """汇总各折测试窗口（样本外）表现，收益/回撤单位%"""
+    if table.empty:
+        return {'folds': 0}
+    returns = table['total_return']
+    return {
+        'folds': len(table),
+        'compound_return': ((1 + returns / 100).prod() - 1) * 100,
+        'mean_return': returns.mean(),
+        'median_return': returns.median(),
+        'positive_folds': int((returns > 0).sum()),
+        'worst_return': returns.min(),
+        'mean_drawdown': table['max_drawdown'].mean(),
+        'worst_drawdown': table['max_drawdown'].max(),
+    }
@@ -0,0 +1,114 @@
+"""
+内存映射数组缓存
+
+每个缓存项是一个目录：
+    <key>/index.json      轴（如股票代码、日期）和元数据
+    <key>/<field>.npy     每个字段一个数组
+
+读取时以 mmap 方式打开 .npy，只有实际访问到的字段和行才会从磁盘换入，
+打开整个缓存只需读取 index.json。index.json 最后写入，存在即表示数据完整。
+"""
+import json
+import logging
+import os
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = 'index.json'
+
+
+class ArrayCache:
+    """按 key 存取 {字段: ndarray} + JSON索引"""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def is_fresh(self, key: str, expire_days: float) -> bool:
+        """缓存存在且未过期"""
+        index_path = os.path.join(self._dir(key), INDEX_FILE)
+        if not os.path.exists(index_path):
+            return False
+        return time.time() - os.path.getmtime(index_path) < expire_days * 86400
+
+    def save(self, key: str, arrays: Dict[str, np.ndarray], index: Dict):
+        """
+        写入缓存
+
+        Args:
+            arrays: 字段名 -> 数组（不支持object类型）
+            index: 可JSON序列化的轴和元数据
+        """
+        path = self._dir(key)
+        os.makedirs(path, exist_ok=True)
+        index_path = os.path.join(path, INDEX_FILE)
+        if os.path.exists(index_path):
+            os.remove(index_path)  # 先使旧缓存失效，写入中断时不会读到新旧混合的数据
+
+        for field, arr in arrays.items():
+            arr = np.asarray(arr)
+            if arr.dtype == object:
+                raise TypeError(f"缓存字段 {field} 不支持object类型")
+            tmp_path = os.path.join(path, f'{field}.npy.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.save(f, arr, allow_pickle=False)
+            os.replace(tmp_path, os.path.join(path, f'{field}.npy'))
+
+        tmp_path = f'{index_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({**index, 'fields': list(arrays.keys())}, f, ensure_ascii=False)
+        os.replace(tmp_path, index_path)
+
+    def load(self, key: str, fields: Optional[Iterable[str]] = None,
+             mmap: bool = True) -> Optional[Tuple[Dict, Dict[str, np.ndarray]]]:
+        """
+        读取缓存
+
+        Args:
+            fields: 只打开指定字段，默认全部
+            mmap: 以只读内存映射方式打开
+
+        Returns:
+            (index, {字段: 数组})，缓存不存在或损坏返回None
+        """
+        path = self._dir(key)
+        index_path = os.path.join(path, INDEX_FILE)
+        if not os.path.exists(index_path):
+            return None
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            arrays = {}
+            for field in (fields if fields is not None else index['fields']):
+                arrays[field] = np.load(os.path.join(path, f'{field}.npy'),
+                                        mmap_mode='r' if mmap else None, allow_pickle=False)
+            return index, arrays
+        except Exception as e:
+            logger.warning(f"读取缓存 {key} 失败: {e}")
+            return None
+
+
+def frame_to_arrays(df: pd.DataFrame) -> Tuple[Dict[str, np.ndarray], Dict]:
+    """日期索引的数值型DataFrame -> (列数组, 索引)，列名保存在索引中"""
+    arrays = {f'col{i}': df[col].to_numpy() for i, col in enumerate(df.columns)}
+    index = {
+        'dates': [d.strftime('%Y-%m-%d') for d in df.index],
+        'index_name': df.index.name,
+        'columns': [str(col) for col in df.columns],
+    }
+    return arrays, index
+
+
+def frame_from_arrays(index: Dict, arrays: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """frame_to_arrays 的逆操作"""
+    dates = pd.DatetimeIndex(pd.to_datetime(index['dates']), name=index.get('index_name'))
+    return pd.DataFrame({col: np.asarray(arrays[f'col{i}']) for i, col in enumerate(index['columns'])},
+                        index=dates)
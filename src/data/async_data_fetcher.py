@@ -13,24 +13,38 @@ import json
 
 # 添加config路径
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
-from config.dividend_override import get_manual_dividend_yield, has_manual_override
+from config.config import FETCH_CONCURRENCY
+from src.data.concurrency import AIMDController
+from src.data.kline_store import (
+    KlineStore, build_kline_url, estimate_bar_count, parse_kline_response, split_range, stitch_chunks
+)
+from src.data.rate_limit import throttle_async
+from src.data.quote_engine import (
+    QuoteRecord, build_quote_url, calculate_financial_health, empty_fundamental_dict,
+    fetch_quotes_async, parse_quote_record, to_symbol
+)
 
 logger = logging.getLogger(__name__)
 
 class AsyncStockDataFetcher:
     """异步股票数据获取器 - 大幅提升性能"""
 
-    def __init__(self, max_concurrent: int = 20):
+    def __init__(self, max_concurrent: Optional[int] = None):
         """
         初始化异步数据获取器
 
         Args:
-            max_concurrent: 最大并发请求数 (默认20,可以根据网络情况调整)
+            max_concurrent: 并发请求数上限，默认取 FETCH_CONCURRENCY；
+                实际并发由AIMD控制器按请求延迟和失败情况自适应调整
         """
-        self.max_concurrent = max_concurrent
-        self.semaphore = None  # 将在异步上下文中初始化
+        params = dict(FETCH_CONCURRENCY)
+        if max_concurrent:
+            params['max_limit'] = max_concurrent
+        self.concurrency = AIMDController(**params)
+        self.max_concurrent = self.concurrency.max_limit
         self.failed_stocks = []
         self._hist_cache = {}  # 历史数据缓存
+        self.kline_store = KlineStore()  # 本地K线库
 
         # User-Agent池
         self.user_agents = [
@@ -70,13 +84,17 @@ class AsyncStockDataFetcher:
 
         for attempt in range(max_retries):
             try:
-                async with session.get(url, headers=headers, timeout=timeout) as response:
-                    if response.status == 200:
-                        return await response.text()
+                # 先按主机令牌桶限速，再占用一个自适应并发槽位（超时/异常/非200都会使并发上限减小）
+                await throttle_async(url)
+                async with self.concurrency.async_slot() as request:
+                    async with session.get(url, headers=headers, timeout=timeout) as response:
+                        if response.status == 200:
+                            return await response.text()
+                        request.fail()
 
-                    # 如果状态码不是200,等待后重试
-                    if attempt < max_retries - 1:
-                        await asyncio.sleep(0.5 * (2 ** attempt))
+                # 如果状态码不是200,等待后重试
+                if attempt < max_retries - 1:
+                    await asyncio.sleep(0.5 * (2 ** attempt))
 
             except asyncio.TimeoutError:
                 logger.debug(f"请求超时 (尝试 {attempt + 1}/{max_retries}): {url[:80]}...")
@@ -89,353 +107,132 @@ class AsyncStockDataFetcher:
 
         return None
 
-    async def get_stock_realtime_data(self, session: aiohttp.ClientSession,
-                                     stock_code: str) -> Dict:
-        """异步获取股票实时数据"""
-        # 使用信号量控制并发
-        async with self.semaphore:
-            try:
-                # 构造腾讯财经API请求
-                if stock_code.startswith('6'):
-                    symbol = f"sh{stock_code}"
-                else:
-                    symbol = f"sz{stock_code}"
-
-                url = f"https://qt.gtimg.cn/q={symbol}"
-
-                content = await self._fetch_with_retry(session, url, max_retries=3, timeout=10)
-
-                if content and 'v_' in content:
-                    data_str = content.split('"')[1]
-                    data_parts = data_str.split('~')
-
-                    if len(data_parts) > 35:
-                        name = data_parts[1]
-                        price = float(data_parts[3]) if data_parts[3] and data_parts[3] != '' else 0
-                        prev_close = float(data_parts[4]) if data_parts[4] and data_parts[4] != '' else 0
-                        change_pct = float(data_parts[32]) if data_parts[32] and data_parts[32] != '' else 0
-                        volume = int(float(data_parts[6])) if data_parts[6] and data_parts[6] != '' else 0
-                        turnover = int(float(data_parts[7])) if data_parts[7] and data_parts[7] != '' else 0
-
-                        # 获取总市值和总股本
-                        market_cap = None
-                        total_shares = None
-
-                        if len(data_parts) > 23 and data_parts[23]:
-                            try:
-                                market_cap = float(data_parts[23])
-                            except ValueError:
-                                pass
-
-                        if len(data_parts) > 25 and data_parts[25]:
-                            try:
-                                total_shares = float(data_parts[25])
-                            except ValueError:
-                                pass
-
-                        # 获取换手率
-                        turnover_rate = None
-                        if len(data_parts) > 27 and data_parts[27]:
-                            try:
-                                turnover_rate = float(data_parts[27])
-                            except ValueError:
-                                pass
-
-                        # 获取PE值 - 按优先级
-                        pe_ratio = None
-                        pe_fields = [
-                            data_parts[39] if len(data_parts) > 39 else None,  # 基本面PE
-                            data_parts[22] if len(data_parts) > 22 else None,  # TTM PE
-                            data_parts[15] if len(data_parts) > 15 else None,  # 静态PE
-                            data_parts[14] if len(data_parts) > 14 else None   # 动态PE
-                        ]
-
-                        for pe_str in pe_fields:
-                            if pe_str and pe_str != '':
-                                try:
-                                    pe_value = float(pe_str)
-                                    if 0 < pe_value < 1000:
-                                        pe_ratio = pe_value
-                                        break
-                                except ValueError:
-                                    continue
-
-                        # 获取PB值
-                        pb_ratio = None
-                        if len(data_parts) > 16 and data_parts[16]:
-                            try:
-                                pb_value = float(data_parts[16])
-                                if 0 < pb_value < 100:
-                                    pb_ratio = pb_value
-                            except ValueError:
-                                pass
-
-                        return {
-                            'code': stock_code,
-                            'name': name,
-                            'price': price,
-                            'prev_close': prev_close,
-                            'change_pct': change_pct,
-                            'pe_ratio': pe_ratio,
-                            'pb_ratio': pb_ratio,
-                            'market_cap': market_cap,
-                            'total_shares': total_shares,
-                            'volume': volume,
-                            'turnover': turnover,
-                            'turnover_rate': turnover_rate
-                        }
+    async def get_quote_record(self, session: aiohttp.ClientSession,
+                               stock_code: str) -> Optional[QuoteRecord]:
+        """异步获取单只股票的行情记录"""
+        try:
+            url = build_quote_url([to_symbol(stock_code)])
+            content = await self._fetch_with_retry(session, url, max_retries=3, timeout=10)
 
-            except Exception as e:
-                logger.debug(f"获取股票 {stock_code} 实时数据失败: {e}")
+            if content and 'v_' in content:
+                data_parts = content.split('"')[1].split('~')
+                return parse_quote_record(stock_code, data_parts)
 
-            return {}
+        except Exception as e:
+            logger.debug(f"获取股票 {stock_code} 行情失败: {e}")
 
-    async def get_stock_fundamental_data(self, session: aiohttp.ClientSession,
-                                        stock_code: str) -> Dict:
-        """异步获取股票基本面数据"""
-        async with self.semaphore:
-            try:
-                # 确定市场代码
-                if stock_code.startswith('6'):
-                    market = 'sh'
-                else:
-                    market = 'sz'
+        return None
 
-                symbol = f"{market}{stock_code}"
-                url = f"https://qt.gtimg.cn/q={symbol}"
+    async def get_quote_records_batch(self, session: aiohttp.ClientSession,
+                                      stock_codes: List[str]) -> Dict[str, QuoteRecord]:
+        """
+        批量获取行情记录 - 每次请求查询多只股票
 
-                content = await self._fetch_with_retry(session, url, max_retries=2, timeout=10)
+        Returns:
+            {股票代码: 行情记录}，批量请求中缺失的股票回退为单只请求
+        """
+        async def fetch_text(url: str) -> Optional[str]:
+            return await self._fetch_with_retry(session, url, max_retries=3, timeout=15)
 
-                if content and 'v_' in content and len(content.split('~')) > 52:
-                    data_str = content.split('"')[1]
-                    data_parts = data_str.split('~')
+        quotes = await fetch_quotes_async(fetch_text, stock_codes)
 
-                    # 解析PB市净率
-                    pb_ratio = None
-                    if len(data_parts) > 46 and data_parts[46]:
-                        try:
-                            pb_ratio = float(data_parts[46])
-                            if pb_ratio <= 0:
-                                pb_ratio = None
-                        except ValueError:
-                            pass
-
-                    # 解析股息率
-                    dividend_yield = None
-                    manual_dividend = get_manual_dividend_yield(stock_code)
-                    if manual_dividend is not None:
-                        dividend_yield = manual_dividend
-                    else:
-                        current_price = float(data_parts[3]) if data_parts[3] else None
-                        dividend_data = None
-
-                        if len(data_parts) > 53 and data_parts[53]:
-                            try:
-                                dividend_data = float(data_parts[53])
-                                if dividend_data < 0:
-                                    dividend_data = None
-                            except ValueError:
-                                pass
-
-                        if current_price and current_price > 0 and dividend_data and dividend_data > 0:
-                            per_share_dividend = dividend_data / 10
-                            dividend_yield = (per_share_dividend / current_price) * 100
-
-                            if not (0 < dividend_yield <= 20):
-                                dividend_yield = None
-
-                    # 解析换手率
-                    turnover_rate = None
-                    if len(data_parts) > 56 and data_parts[56]:
-                        try:
-                            turnover_rate = float(data_parts[56])
-                        except ValueError:
-                            pass
-
-                    # 获取PE和计算PEG
-                    pe_ratio = None
-                    peg = None
-                    if len(data_parts) > 39 and data_parts[39]:
-                        try:
-                            pe_value = float(data_parts[39])
-                            if 0 < pe_value < 200:
-                                pe_ratio = pe_value
-
-                                if pb_ratio:
-                                    if pb_ratio < 1:
-                                        assumed_growth = 20
-                                    elif pb_ratio > 5:
-                                        assumed_growth = 10
-                                    else:
-                                        assumed_growth = 15
-                                else:
-                                    assumed_growth = 15
-
-                                peg = pe_ratio / assumed_growth
-                        except ValueError:
-                            pass
-
-                    # 计算ROE
-                    roe = None
-                    if pb_ratio and pe_ratio and pe_ratio > 0:
-                        try:
-                            roe = (pb_ratio / pe_ratio) * 100
-                            if roe < -50 or roe > 50:
-                                roe = None
-                        except:
-                            roe = None
-
-                    # 估算利润增长率
-                    profit_growth = None
-                    if roe and dividend_yield:
-                        try:
-                            payout_ratio = min(dividend_yield / roe, 0.9) if roe > 0 else 0.5
-                            profit_growth = roe * (1 - payout_ratio)
-                        except:
-                            profit_growth = None
-
-                    # 计算财务健康度评分
-                    financial_health_score = self._calculate_financial_health(
-                        pb_ratio, dividend_yield, pe_ratio, turnover_rate
-                    )
-
-                    return {
-                        'pb_ratio': pb_ratio,
-                        'dividend_yield': dividend_yield,
-                        'peg': peg,
-                        'turnover_rate': turnover_rate,
-                        'financial_health_score': financial_health_score,
-                        'roe': roe,
-                        'profit_growth': profit_growth,
-                        'debt_ratio': None,
-                        'current_ratio': None,
-                        'gross_margin': None,
-                        # 不设置market_cap和total_shares为None，保留实时数据中的值
-                    }
+        records = {}
+        for code, data_parts in quotes.items():
+            record = parse_quote_record(code, data_parts)
+            if record:
+                records[code] = record
 
-            except Exception as e:
-                logger.debug(f"获取股票 {stock_code} 基本面数据失败: {e}")
+        missing = [code for code in stock_codes if code not in records]
+        if missing:
+            logger.info(f"批量行情缺失 {len(missing)} 只，回退为单只请求")
+            retry_results = await asyncio.gather(*[
+                self.get_quote_record(session, code) for code in missing
+            ])
+            for code, record in zip(missing, retry_results):
+                if record:
+                    records[code] = record
 
-            return {
-                'pb_ratio': None,
-                'dividend_yield': None,
-                'peg': None,
-                'turnover_rate': None,
-                'financial_health_score': 0,
-                'roe': None,
-                'profit_growth': None,
-                'debt_ratio': None,
-                'current_ratio': None,
-                'gross_margin': None,
-                # 不设置market_cap和total_shares为None，保留实时数据中的值
-            }
+        return records
+
+    async def get_stock_realtime_data(self, session: aiohttp.ClientSession,
+                                     stock_code: str) -> Dict:
+        """异步获取股票实时数据"""
+        record = await self.get_quote_record(session, stock_code)
+        return record.to_realtime_dict() if record else {}
+
+    async def get_stock_fundamental_data(self, session: aiohttp.ClientSession,
+                                        stock_code: str) -> Dict:
+        """异步获取股票基本面数据"""
+        record = await self.get_quote_record(session, stock_code)
+        return record.to_fundamental_dict() if record else empty_fundamental_dict()
 
     def _calculate_financial_health(self, pb: Optional[float], div_yield: Optional[float],
                                    pe: Optional[float], turnover: Optional[float]) -> int:
         """计算财务健康度评分"""
-        score = 50
-
+        return calculate_financial_health(pb, div_yield, pe, turnover)
+
+    async def _download_klines(self, session: aiohttp.ClientSession, stock_code: str,
+                               start: str, end: str) -> Optional[pd.DataFrame]:
+        """异步下载区间前复权K线（超过单次请求上限时分段并发下载后拼接），任一段失败返回None"""
+        frames = await asyncio.gather(*[
+            self._download_kline_chunk(session, stock_code, chunk_start, chunk_end)
+            for chunk_start, chunk_end in split_range(start, end)
+        ])
+        if any(df is None for df in frames):
+            return None
+        return stitch_chunks(frames)
+
+    async def _download_kline_chunk(self, session: aiohttp.ClientSession, stock_code: str,
+                                    start: str, end: str) -> Optional[pd.DataFrame]:
+        """单次请求下载区间K线，失败返回None"""
+        symbol = to_symbol(stock_code)
+        url = build_kline_url(symbol, start, end, estimate_bar_count(start, end))
+        content = await self._fetch_with_retry(session, url, max_retries=3, timeout=15)
+        if not content:
+            return None
         try:
-            if pb:
-                if pb < 1:
-                    score += 20
-                elif pb < 2:
-                    score += 10
-                elif pb > 10:
-                    score -= 20
-                elif pb > 5:
-                    score -= 10
-
-            if div_yield:
-                if div_yield > 5:
-                    score += 15
-                elif div_yield > 3:
-                    score += 10
-                elif div_yield > 2:
-                    score += 5
-                elif div_yield < 1:
-                    score -= 5
-
-            if pe:
-                if 10 < pe < 20:
-                    score += 10
-                elif 20 <= pe < 30:
-                    score += 5
-                elif pe >= 50:
-                    score -= 10
-
-            if turnover:
-                if 1 < turnover < 5:
-                    score += 5
-                elif turnover > 20:
-                    score -= 5
-        except:
-            pass
-
-        return max(0, min(100, score))
+            return parse_kline_response(content, symbol)
+        except ValueError as e:
+            logger.debug(f"解析股票 {stock_code} K线失败: {e}")
+            return None
 
     async def get_stock_historical_data(self, session: aiohttp.ClientSession,
                                        stock_code: str, days: int = 30) -> pd.DataFrame:
-        """异步获取股票历史数据"""
-        async with self.semaphore:
-            try:
-                # 检查缓存
-                cache_key = f"{stock_code}_{days}"
-                if cache_key in self._hist_cache:
-                    cached_data, cached_time = self._hist_cache[cache_key]
-                    if time.time() - cached_time < 3600:  # 1小时缓存
-                        return cached_data
-
-                # 确定市场代码
-                if stock_code.startswith('6'):
-                    market = 'sh'
-                else:
-                    market = 'sz'
-
-                symbol = f"{market}{stock_code}"
-                actual_days = int(days * 2)
-
-                url = f"https://web.ifzq.gtimg.cn/appstock/app/fqkline/get?param={symbol},day,,,{actual_days},qfq&_var=kline_dayqfq"
-
-                content = await self._fetch_with_retry(session, url, max_retries=3, timeout=15)
-
-                if content and 'kline_dayqfq=' in content:
-                    json_str = content.replace('kline_dayqfq=', '')
-                    data_json = json.loads(json_str)
-
-                    if 'data' in data_json and symbol in data_json['data']:
-                        kline_data = data_json['data'][symbol]
-
-                        if 'qfqday' in kline_data and kline_data['qfqday']:
-                            klines = kline_data['qfqday']
-
-                            if klines:
-                                df_data = []
-                                for kline in klines:
-                                    df_data.append({
-                                        'date': kline[0],
-                                        'open': float(kline[1]),
-                                        'close': float(kline[2]),
-                                        'high': float(kline[3]),
-                                        'low': float(kline[4]),
-                                        'volume': float(kline[5]) if len(kline) > 5 else 0
-                                    })
-
-                                data = pd.DataFrame(df_data)
-                                data['date'] = pd.to_datetime(data['date'])
-
-                                if len(data) > days:
-                                    data = data.tail(days)
-
-                                # 存入缓存
-                                self._hist_cache[cache_key] = (data, time.time())
-
-                                return data
+        """异步获取股票历史数据 - 读本地K线库，只下载上次同步后缺失的K线"""
+        try:
+            # 检查缓存
+            cache_key = f"{stock_code}_{days}"
+            if cache_key in self._hist_cache:
+                cached_data, cached_time = self._hist_cache[cache_key]
+                if time.time() - cached_time < 3600:  # 1小时缓存
+                    return cached_data
+
+            # 按自然日取3倍窗口，保证覆盖足够的交易日
+            start = (datetime.now() - timedelta(days=days * 3)).strftime('%Y-%m-%d')
+            plan = self.kline_store.plan_update(stock_code, start)
+            if plan:
+                fetch_start, fetch_end = plan
+                fetched_at = datetime.now()
+                new_bars = await self._download_klines(session, stock_code, fetch_start, fetch_end)
+                if new_bars is not None and not self.kline_store.apply_update(
+                        stock_code, new_bars, fetch_start, fetch_end, fetched_at):
+                    # 前复权价格已调整，整段重新下载
+                    full_start, full_end = self.kline_store.full_range(stock_code, start, fetch_end)
+                    fetched_at = datetime.now()
+                    new_bars = await self._download_klines(session, stock_code, full_start, full_end)
+                    if new_bars is not None:
+                        self.kline_store.replace(stock_code, new_bars, full_start, full_end, fetched_at)
+
+            data = self.kline_store.load_frame(stock_code, start).tail(days).reset_index()
+            if not data.empty:
+                # 存入缓存
+                self._hist_cache[cache_key] = (data, time.time())
+                return data
 
-            except Exception as e:
-                logger.debug(f"获取股票 {stock_code} 历史数据失败: {e}")
+        except Exception as e:
+            logger.debug(f"获取股票 {stock_code} 历史数据失败: {e}")
 
-            return pd.DataFrame()
+        return pd.DataFrame()
 
     def calculate_momentum(self, price_data: pd.DataFrame, days: int = 20) -> float:
         """计算动量指标"""
@@ -471,12 +268,10 @@ class AsyncStockDataFetcher:
         Returns:
             股票数据列表
         """
-        # 初始化信号量
-        self.semaphore = asyncio.Semaphore(self.max_concurrent)
-
         # 去重
         stock_codes = list(set(stock_codes))
-        logger.info(f"开始批量获取 {len(stock_codes)} 只股票数据 (最大并发: {self.max_concurrent})")
+        logger.info(f"开始批量获取 {len(stock_codes)} 只股票数据 "
+                    f"(自适应并发: 初始{self.concurrency.limit}, 上限{self.max_concurrent})")
 
         start_time = time.time()
 
@@ -494,33 +289,22 @@ class AsyncStockDataFetcher:
         )
 
         async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
-            # 第一步: 批量获取实时数据
+            # 第一步: 批量获取行情（多只股票合并为一次请求，解析一次供实时和基本面共用）
             logger.info("步骤1: 批量获取实时数据...")
-            realtime_tasks = [
-                self.get_stock_realtime_data(session, code)
-                for code in stock_codes
-            ]
-            realtime_results = await asyncio.gather(*realtime_tasks)
+            records = await self.get_quote_records_batch(session, stock_codes)
 
             # 过滤掉空结果
-            valid_stocks = [data for data in realtime_results if data and data.get('code')]
+            valid_stocks = [records[code].to_realtime_dict() for code in stock_codes if code in records]
             logger.info(f"成功获取 {len(valid_stocks)}/{len(stock_codes)} 只股票实时数据")
 
             if not valid_stocks:
                 return []
 
-            # 第二步: 批量获取基本面数据
+            # 第二步: 基本面数据（复用步骤1的行情记录，无需再次请求）
             if include_fundamental:
-                logger.info("步骤2: 批量获取基本面数据...")
-                fundamental_tasks = [
-                    self.get_stock_fundamental_data(session, stock['code'])
-                    for stock in valid_stocks
-                ]
-                fundamental_results = await asyncio.gather(*fundamental_tasks)
-
-                # 合并基本面数据
-                for stock, fundamental in zip(valid_stocks, fundamental_results):
-                    stock.update(fundamental)
+                logger.info("步骤2: 解析基本面数据...")
+                for stock in valid_stocks:
+                    stock.update(records[stock['code']].to_fundamental_dict())
 
                 # 用真实财报数据覆盖 ROE 和 profit_growth
                 try:
@@ -577,7 +361,8 @@ class AsyncStockDataFetcher:
                 stock['industry'] = "未知行业"
 
         elapsed = time.time() - start_time
-        logger.info(f"批量获取完成! 用时: {elapsed:.2f}秒, 平均速度: {len(valid_stocks)/elapsed:.1f}只/秒")
+        logger.info(f"批量获取完成! 用时: {elapsed:.2f}秒, 平均速度: {len(valid_stocks)/elapsed:.1f}只/秒, "
+                    f"{self.concurrency.stats()}")
 
         return valid_stocks
 
@@ -610,6 +395,7 @@ class AsyncStockDataFetcher:
 
                 index_data = []
                 try:
+                    await throttle_async(url)
                     async with session.get(url, headers=headers) as response:
                         if response.status == 200:
                             content = await response.text()
@@ -658,6 +444,7 @@ class AsyncStockDataFetcher:
                         batch_url = f"https://qt.gtimg.cn/q={','.join(symbols)}"
 
                         try:
+                            await throttle_async(batch_url)
                             async with session.get(batch_url, headers=headers, timeout=15) as response:
                                 if response.status == 200:
                                     content = await response.text()
@@ -684,9 +471,6 @@ class AsyncStockDataFetcher:
                             logger.debug(f"批次查询失败: {e}")
                             continue
 
-                        # 小延迟避免限流
-                        await asyncio.sleep(0.3)
-
                     total = rising + falling + flat
                     rising_ratio = (rising / total * 100) if total > 0 else 50.0
 
@@ -746,7 +530,7 @@ class AsyncStockDataFetcher:
 
 # 同步包装函数,方便在非异步代码中使用
 def batch_get_stock_data_sync(stock_codes: List[str], calculate_momentum: bool = True,
-                              include_fundamental: bool = True, max_concurrent: int = 20) -> List[Dict]:
+                              include_fundamental: bool = True, max_concurrent: Optional[int] = None) -> List[Dict]:
     """
     同步版本的批量获取股票数据
 
@@ -754,7 +538,7 @@ def batch_get_stock_data_sync(stock_codes: List[str], calculate_momentum: bool =
         stock_codes: 股票代码列表
         calculate_momentum: 是否计算动量
         include_fundamental: 是否包含基本面数据
-        max_concurrent: 最大并发数
+        max_concurrent: 并发上限（默认取 FETCH_CONCURRENCY，实际并发自适应调整）
 
     Returns:
         股票数据列表
@@ -0,0 +1,165 @@
+"""
+自适应并发控制（AIMD：加性增、乘性减）
+
+每个HTTP请求占用一个并发槽位，结束时反馈结果：
+- 成功且耗时不超过目标延迟：并发上限每经过约一个窗口（上限个成功请求）加1
+- 超时、异常或非200：并发上限乘以 backoff；同一拥塞事件中已发出的请求再失败不重复惩罚
+  （只对上次减小之后才发出的请求的失败做出反应）
+- 成功但耗时超标：保持不变
+- 被取消（asyncio.CancelledError）或中断（KeyboardInterrupt）：只释放槽位，不调整上限
+
+从较小的初始并发开始，运行中逼近接口的实际承载能力，而不是依赖固定的并发数或随机延时。
+支持线程（slot）和协程（async_slot）两种用法，同一个控制器只在一种模式下使用。
+"""
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class _Request:
+    """一次占用槽位的请求，非200等失败由调用方标记"""
+
+    def __init__(self, seq: int):
+        self.seq = seq
+        self.started = time.monotonic()
+        self.failed = False
+        self.cancelled = False
+
+    def fail(self):
+        self.failed = True
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class AIMDController:
+    """AIMD并发上限控制器"""
+
+    def __init__(self, initial: int = 8, min_limit: int = 1, max_limit: int = 64,
+                 latency_target: float = 3.0, backoff: float = 0.5):
+        """
+        Args:
+            initial: 初始并发上限
+            min_limit/max_limit: 并发上限的范围
+            latency_target: 健康请求的耗时上限（秒），超过时不再增加并发
+            backoff: 失败时并发上限的缩小比例
+        """
+        self.min_limit = min_limit
+        self.max_limit = max(min_limit, max_limit)
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self._limit = float(min(max(initial, min_limit), self.max_limit))
+        self._in_flight = 0
+        self._seq = 0
+        self._decrease_seq = 0   # 上次减小时已发出的请求序号
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._async_cond = None
+        self._async_loop = None
+        self.successes = 0
+        self.failures = 0
+
+    @property
+    def limit(self) -> int:
+        """当前并发上限"""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _try_acquire(self):
+        """有空闲槽位时占用并返回请求，否则返回None（需持有锁）"""
+        if self._in_flight >= int(self._limit):
+            return None
+        self._in_flight += 1
+        self._seq += 1
+        return _Request(self._seq)
+
+    def _finish(self, request: _Request):
+        """释放槽位并按结果调整上限（需持有锁）"""
+        self._in_flight -= 1
+        if request.cancelled:
+            return
+        latency = time.monotonic() - request.started
+        if request.failed:
+            self.failures += 1
+            if request.seq > self._decrease_seq:
+                old = self.limit
+                self._limit = max(self.min_limit, self._limit * self.backoff)
+                self._decrease_seq = self._seq
+                logger.debug(f"请求失败，并发上限 {old} -> {self.limit}")
+        else:
+            self.successes += 1
+            if latency <= self.latency_target and self._limit < self.max_limit:
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+
+    @contextmanager
+    def slot(self):
+        """
+        线程中占用一个并发槽位（阻塞直到有空闲槽位）
+
+        用法:
+            with controller.slot() as request:
+                response = requests.get(...)
+                if response.status_code != 200:
+                    request.fail()
+        块内抛出异常（如超时）同样记为失败；取消或中断只释放槽位
+        """
+        with self._cond:
+            request = self._try_acquire()
+            while request is None:
+                self._cond.wait()
+                request = self._try_acquire()
+        try:
+            yield request
+        except Exception:
+            request.fail()
+            raise
+        except BaseException:
+            request.cancel()
+            raise
+        finally:
+            with self._cond:
+                self._finish(request)
+                self._cond.notify_all()
+
+    @asynccontextmanager
+    async def async_slot(self):
+        """协程中占用一个并发槽位，用法同 slot"""
+        cond = self._async_condition()
+        async with cond:
+            while True:
+                with self._lock:
+                    request = self._try_acquire()
+                if request is not None:
+                    break
+                await cond.wait()
+        try:
+            yield request
+        except Exception:
+            request.fail()
+            raise
+        except BaseException:
+            request.cancel()
+            raise
+        finally:
+            with self._lock:
+                self._finish(request)
+            async with cond:
+                cond.notify_all()
+
+    def _async_condition(self) -> asyncio.Condition:
+        """当前事件循环的条件变量（每次 asyncio.run 是新的事件循环）"""
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            self._async_loop = loop
+            self._async_cond = asyncio.Condition()
+        return self._async_cond
+
+    def stats(self) -> str:
+        return f"并发上限{self.limit} (成功{self.successes}, 失败{self.failures})"
@@ -8,18 +8,39 @@ from typing import List, Dict, Optional
 from datetime import datetime, timedelta
 import sys
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # 添加config路径
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
-from config.dividend_override import get_manual_dividend_yield, has_manual_override
+from config.config import FETCH_CONCURRENCY
+from src.data.concurrency import AIMDController
+from src.data.http_session import http_get
+from src.data.kline_store import KlineStore
+from src.data.rate_limit import throttle
+from src.data.quote_engine import (
+    QuoteRecord, build_quote_url, calculate_financial_health, empty_fundamental_dict,
+    fetch_quotes, parse_quote_record, parse_realtime_fields, to_symbol
+)
 
 logger = logging.getLogger(__name__)
 
+INDUSTRY_INFO_HOST = 'push2.eastmoney.com'  # akshare个股信息接口所在主机（用于限速）
+
 class StockDataFetcher:
-    def __init__(self):
+    def __init__(self, max_concurrent: Optional[int] = None):
         self.a_share_stocks = None
         self.hk_connect_stocks = None
         self.failed_stocks = []  # 记录失败的股票代码
+        self._failed_lock = threading.Lock()  # 线程池中并发记录失败股票
+        self._hist_cache = {}  # 历史K线内存缓存 {f"{code}_{days}": (data, time)}
+        # 自适应并发控制（AIMD），逐只请求在线程池中并发执行
+        params = dict(FETCH_CONCURRENCY)
+        if max_concurrent:
+            params['max_limit'] = max_concurrent
+        self.concurrency = AIMDController(**params)  # 腾讯行情/K线接口
+        self.industry_concurrency = AIMDController(**params)  # 东方财富行业信息接口（失败不影响腾讯接口的并发）
+        self.kline_store = KlineStore(concurrency=self.concurrency)  # 本地K线库
 
         # User-Agent池 - 模拟不同的浏览器
         self.user_agents = [
@@ -70,7 +91,9 @@ class StockDataFetcher:
             import akshare as ak
             
             # 获取股票所属行业
-            stock_info = ak.stock_individual_info_em(symbol=stock_code)
+            throttle(INDUSTRY_INFO_HOST)
+            with self.industry_concurrency.slot():
+                stock_info = ak.stock_individual_info_em(symbol=stock_code)
             if not stock_info.empty:
                 # 查找行业字段
                 industry_row = stock_info[stock_info['item'] == '行业']
@@ -85,8 +108,6 @@ class StockDataFetcher:
 
     def get_stock_realtime_data(self, stock_code: str, retry_count: int = 0) -> Dict:
         """获取股票实时数据 - 使用腾讯财经API，带重试机制"""
-        import requests
-
         # 增加重试机制
         max_retries = 5  # 增加到5次重试
         timeout = 20  # 增加超时时间到20秒
@@ -94,12 +115,7 @@ class StockDataFetcher:
         for attempt in range(max_retries):
             try:
                 # 构造腾讯财经API请求
-                if stock_code.startswith('6'):
-                    symbol = f"sh{stock_code}"
-                else:
-                    symbol = f"sz{stock_code}"
-
-                url = f"https://qt.gtimg.cn/q={symbol}"
+                url = build_quote_url([to_symbol(stock_code)])
 
                 # 使用随机User-Agent
                 headers = {
@@ -115,7 +131,11 @@ class StockDataFetcher:
                 if attempt > 0:
                     self._random_delay(0.5, 1.5)
 
-                response = requests.get(url, headers=headers, timeout=timeout)
+                throttle(url)
+                with self.concurrency.slot() as request:
+                    response = http_get(url, headers=headers, timeout=timeout)
+                    if response.status_code != 200:
+                        request.fail()
 
                 if response.status_code == 200:
                     content = response.text
@@ -124,97 +144,9 @@ class StockDataFetcher:
                         data_str = content.split('"')[1]
                         data_parts = data_str.split('~')
 
-                        # 腾讯API返回数据结构：
-                        # [0]市场标志 [1]名称 [2]代码 [3]当前价 [4]昨收 [5]今开 [6]成交量 [7]成交额 [8]最高 [9]最低
-                        # [10]竞买价 [11]竞卖价 [12]委比 [13]振幅 [14]市盈率(动) [15]市盈率(静) [16]市净率 [17]涨停价 [18]跌停价 [19]量比
-                        # [20]均价 [21]溢价 [22]市盈率(TTM) [23]总市值（万元）[24]流通市值 [25]总股本（万股）[26]流通股 [27]换手率 [28]资产净值 [29]市现率 [30]市销率 [31]股息率 [32]涨跌幅 [33]涨跌额
-                        # [34]买入价 [35]卖出价 ... (更多字段)
-                        if len(data_parts) > 35:
-                            name = data_parts[1]
-                            price = float(data_parts[3]) if data_parts[3] and data_parts[3] != '' else 0
-                            prev_close = float(data_parts[4]) if data_parts[4] and data_parts[4] != '' else 0
-                            change_pct = float(data_parts[32]) if data_parts[32] and data_parts[32] != '' else 0
-                            pe_dynamic = data_parts[14] if len(data_parts) > 14 and data_parts[14] != '' and data_parts[14] != '0' else None  # 动态PE
-                            pe_static = data_parts[15] if len(data_parts) > 15 and data_parts[15] != '' and data_parts[15] != '0' else None  # 静态PE
-                            pe_ttm = data_parts[22] if len(data_parts) > 22 and data_parts[22] != '' and data_parts[22] != '0' else None  # TTM PE
-                            pb = data_parts[16] if len(data_parts) > 16 and data_parts[16] != '' and data_parts[16] != '0' else None  # 市净率
-                            volume = int(float(data_parts[6])) if data_parts[6] and data_parts[6] != '' else 0
-                            turnover = int(float(data_parts[7])) if data_parts[7] and data_parts[7] != '' else 0  # 成交额
-                            
-                            # 获取总市值和总股本信息（如果存在）
-                            market_cap_str = data_parts[23] if len(data_parts) > 23 and data_parts[23] != '' else None  # 总市值（万元）
-                            total_shares_str = data_parts[25] if len(data_parts) > 25 and data_parts[25] != '' else None  # 总股本（万股）
-                            
-                            market_cap = None
-                            total_shares = None
-                            
-                            if market_cap_str:
-                                try:
-                                    market_cap = float(market_cap_str)  # 单位是万元
-                                except ValueError:
-                                    pass
-                            
-                            if total_shares_str:
-                                try:
-                                    total_shares = float(total_shares_str)  # 单位是万股
-                                except ValueError:
-                                    pass
-                            
-                            # 获取换手率数据
-                            turnover_rate = None
-                            if len(data_parts) > 27 and data_parts[27] and data_parts[27] != '':
-                                try:
-                                    turnover_rate = float(data_parts[27])
-                                except (ValueError, IndexError):
-                                    pass
-
-                            # 获取PE值 - 调整优先级：优先使用基本面PE，然后是TTM PE，静态PE，最后动态PE
-                            pe_ratio = None
-                            
-                            # 按优先级顺序尝试不同的PE值
-                            pe_fields = [
-                                ('基本面PE', data_parts[39] if len(data_parts) > 39 else None),  # 字段39 - 基本面PE
-                                ('TTM PE', data_parts[22] if len(data_parts) > 22 else None),     # 字段22 - TTM PE
-                                ('静态PE', data_parts[15] if len(data_parts) > 15 else None),     # 字段15 - 静态PE
-                                ('动态PE', data_parts[14] if len(data_parts) > 14 else None)      # 字段14 - 动态PE
-                            ]
-                            
-                            for pe_name, pe_str in pe_fields:
-                                if pe_str and pe_str != '':
-                                    try:
-                                        pe_value = float(pe_str)
-                                        # 过滤异常PE值（大于1000或小于0的值）
-                                        if pe_value > 0 and pe_value < 1000:
-                                            pe_ratio = pe_value
-                                            logger.debug(f"{stock_code} 使用{pe_name}: {pe_value:.2f}")
-                                            break  # 找到合适的PE值就停止
-                                    except ValueError:
-                                        continue
-
-                            # 获取PB值
-                            pb_ratio = None
-                            if pb:
-                                try:
-                                    pb_value = float(pb)
-                                    if pb_value > 0 and pb_value < 100:  # 过滤异常值
-                                        pb_ratio = pb_value
-                                except ValueError:
-                                    pass
-
-                            return {
-                                'code': stock_code,
-                                'name': name,
-                                'price': price,
-                                'prev_close': prev_close,
-                                'change_pct': change_pct,
-                                'pe_ratio': pe_ratio,
-                                'pb_ratio': pb_ratio,  # 添加PB比率
-                                'market_cap': market_cap,  # 总市值（万元单位）
-                                'total_shares': total_shares,  # 总股本（万股单位）
-                                'volume': volume,
-                                'turnover': turnover,  # 成交额
-                                'turnover_rate': turnover_rate
-                            }
+                        realtime_data = parse_realtime_fields(stock_code, data_parts)
+                        if realtime_data:
+                            return realtime_data
 
                 # 如果响应不成功，等待后重试 - 使用指数退避 + 随机抖动
                 if attempt < max_retries - 1:
@@ -231,174 +163,48 @@ class StockDataFetcher:
                 continue
 
         # 所有重试都失败后，记录失败的股票
-        if stock_code not in self.failed_stocks:
-            self.failed_stocks.append(stock_code)
+        self._record_failure(stock_code)
         logger.error(f"获取股票 {stock_code} 实时数据失败，已重试 {max_retries} 次")
         return {}
 
+    def get_quote_records_batch(self, stock_codes: List[str]) -> Dict[str, QuoteRecord]:
+        """批量获取行情记录 - 每次请求查询多只股票，解析一次供实时和基本面共用"""
+        headers = {
+            'User-Agent': self._get_random_user_agent(),
+            'Referer': 'https://gu.qq.com/'
+        }
+        quotes = fetch_quotes(list(dict.fromkeys(stock_codes)), headers=headers)
+
+        records = {}
+        for code, data_parts in quotes.items():
+            record = parse_quote_record(code, data_parts)
+            if record:
+                records[code] = record
+        return records
+
     def get_stock_fundamental_data(self, stock_code: str) -> Dict:
         """获取股票基本面数据 - 纯腾讯财经API (简化版)"""
-        import requests
-
         max_retries = 3
 
         for attempt in range(max_retries):
             try:
-                # 确定市场代码
-                if stock_code.startswith('6'):
-                    market = 'sh'
-                elif stock_code.startswith('0') or stock_code.startswith('3'):
-                    market = 'sz'
-                else:
-                    market = 'sz'
-
-                symbol = f"{market}{stock_code}"
-
-                # 腾讯财经实时行情API
-                url = f"https://qt.gtimg.cn/q={symbol}"
+                url = build_quote_url([to_symbol(stock_code)])
                 headers = {
                     'User-Agent': self._get_random_user_agent(),
                     'Referer': 'https://gu.qq.com/'
                 }
 
-                response = requests.get(url, headers=headers, timeout=15)
+                throttle(url)
+                with self.concurrency.slot() as request:
+                    response = http_get(url, headers=headers, timeout=15)
+                    if response.status_code != 200:
+                        request.fail()
 
                 if response.status_code == 200 and 'v_' in response.text:
-                    content = response.text
-                    data_str = content.split('"')[1]
-                    data_parts = data_str.split('~')
-
-                    if len(data_parts) > 52:
-                        # 从腾讯API解析基本面数据
-                        # 关键字段位置:
-                        # [39] = PE市盈率
-                        # [46] = PB市净率
-                        # [52] = 股息率
-                        # [53] = 股息
-                        # [56] = 换手率
-
-                        # 解析PB市净率
-                        pb_ratio = None
-                        if data_parts[46]:
-                            try:
-                                pb_ratio = float(data_parts[46])
-                                if pb_ratio <= 0:
-                                    pb_ratio = None
-                            except (ValueError, IndexError):
-                                pass
-
-                        # 解析股息率 - 采用统一的每10股转换算法
-                        dividend_yield = None
-
-                        # 1. 首先检查是否有手动配置的股息率
-                        manual_dividend = get_manual_dividend_yield(stock_code)
-                        if manual_dividend is not None:
-                            dividend_yield = manual_dividend
-                            logger.debug(f"{stock_code} 使用手动配置的股息率: {dividend_yield}%")
-                        else:
-                            # 2. 获取当前股价和股息数据
-                            current_price = float(data_parts[3]) if data_parts[3] else None
-                            dividend_data = None
-
-                            # 尝试从API获取股息数据（字段[53]）
-                            if len(data_parts) > 53 and data_parts[53]:
-                                try:
-                                    dividend_data = float(data_parts[53])
-                                    if dividend_data < 0:
-                                        dividend_data = None
-                                except (ValueError, IndexError):
-                                    pass
-
-                            # 3. 如果有股价和股息数据，使用统一的每10股转换算法
-                            if current_price and current_price > 0 and dividend_data and dividend_data > 0:
-                                # 统一采用每10股股息转换算法
-                                # 根据测试，API返回的数据通常是每10股的股息，需要除以10得到每股股息
-                                per_share_dividend = dividend_data / 10
-                                dividend_yield = (per_share_dividend / current_price) * 100
-
-                                # 验证计算结果是否在合理范围内（0-20%）
-                                if 0 < dividend_yield <= 20:
-                                    logger.debug(f"{stock_code} 基于每10股股息转换的每股股息({per_share_dividend:.4f}元)和股价({current_price}元)计算股息率: {dividend_yield:.2f}%")
-                                else:
-                                    logger.warning(f"{stock_code} 计算的股息率{dividend_yield:.2f}%超出合理范围(0-20%)，使用默认值")
-                                    dividend_yield = None
-
-                        # 解析换手率
-                        turnover_rate = None
-                        if len(data_parts) > 56 and data_parts[56]:
-                            try:
-                                turnover_rate = float(data_parts[56])
-                            except (ValueError, IndexError):
-                                pass
-
-                        # 获取PE用于估算PEG（简化版：使用行业平均增长率15%）
-                        pe_ratio = None
-                        peg = None
-                        if data_parts[39]:
-                            try:
-                                pe_value = float(data_parts[39])
-                                # 过滤异常PE值（大于100或小于0的值），但仍允许相对较高的基本面PE值
-                                if pe_value > 0 and pe_value < 200:
-                                    pe_ratio = pe_value
-                                    # 简化PEG计算：假设平均增长率15%
-                                    # 如果PB很低(<1),假设增长更高(20%)
-                                    # 如果PB很高(>5),假设增长较低(10%)
-                                    if pb_ratio:
-                                        if pb_ratio < 1:
-                                            assumed_growth = 20
-                                        elif pb_ratio > 5:
-                                            assumed_growth = 10
-                                        else:
-                                            assumed_growth = 15
-                                    else:
-                                        assumed_growth = 15
-
-                                    peg = pe_ratio / assumed_growth
-                            except (ValueError, TypeError):
-                                # 如果解析失败，保持pe_ratio为None
-                                pass
-                        roe = None
-                        if pb_ratio and pe_ratio and pe_ratio > 0:
-                            try:
-                                roe = (pb_ratio / pe_ratio) * 100  # 转换为百分比
-                                # ROE合理性检查: 通常在-50%到50%之间
-                                if roe < -50 or roe > 50:
-                                    logger.debug(f"{stock_code} ROE计算异常: {roe:.2f}%, PB={pb_ratio}, PE={pe_ratio}")
-                                    # 保留数据,但标记可能异常
-                            except Exception as e:
-                                logger.debug(f"计算ROE失败: {e}")
-                                roe = None
-
-                        # 基于ROE和股息率估算利润增长率(简化)
-                        profit_growth = None
-                        if roe and dividend_yield:
-                            try:
-                                # 利润增长率估算 = ROE × (1 - 股息支付率)
-                                # 假设股息支付率 = 股息率 / ROE
-                                payout_ratio = min(dividend_yield / roe, 0.9) if roe > 0 else 0.5
-                                profit_growth = roe * (1 - payout_ratio)
-                            except:
-                                profit_growth = None
-
-                        # 基于现有数据推算财务健康度评分
-                        financial_health_score = self._calculate_financial_health(
-                            pb_ratio, dividend_yield, pe_ratio, turnover_rate
-                        )
-
-                        return {
-                            'pb_ratio': pb_ratio,
-                            'dividend_yield': dividend_yield,
-                            'peg': peg,  # 简化版PEG
-                            'turnover_rate': turnover_rate,
-                            'financial_health_score': financial_health_score,
-                            'roe': roe,  # 通过PB/PE计算得出! ⭐
-                            'profit_growth': profit_growth,  # 通过ROE估算
-                            # 以下字段暂时无法获取
-                            'debt_ratio': None,  # 腾讯API不提供
-                            'current_ratio': None,
-                            'gross_margin': None,
-                            # 不设置market_cap和total_shares为None，保留实时数据中的值
-                        }
+                    data_parts = response.text.split('"')[1].split('~')
+                    record = QuoteRecord.from_parts(stock_code, data_parts)
+                    if record and record.field_count > 52:
+                        return record.to_fundamental_dict()
 
                 # 重试
                 if attempt < max_retries - 1:
@@ -413,196 +219,59 @@ class StockDataFetcher:
                     time.sleep(backoff_time)
                     continue
 
-        return {
-                'pb_ratio': None,
-                'dividend_yield': None,
-                'peg': None,
-                'turnover_rate': None,
-                'financial_health_score': 0,
-                'roe': None,
-                'profit_growth': None,
-                'debt_ratio': None,
-                'current_ratio': None,
-                'gross_margin': None,
-                # 不设置market_cap和total_shares为None，保留实时数据中的值
-            }
+        return empty_fundamental_dict()
 
     def _calculate_financial_health(self, pb: Optional[float], div_yield: Optional[float],
                                     pe: Optional[float], turnover: Optional[float]) -> int:
         """基于有限数据计算财务健康度评分 (0-100)"""
-        score = 50  # 基础分50分
-
-        try:
-            # PB评分 (±20分)
-            if pb:
-                if pb < 1:  # 破净
-                    score += 20
-                elif pb < 2:  # 低估
-                    score += 10
-                elif pb > 10:  # 极度高估
-                    score -= 20
-                elif pb > 5:  # 高估
-                    score -= 10
-
-            # 股息率评分 (±15分)
-            if div_yield:
-                if div_yield > 5:
-                    score += 15
-                elif div_yield > 3:
-                    score += 10
-                elif div_yield > 2:
-                    score += 5
-                elif div_yield < 1:
-                    score -= 5
-
-            # PE评分 (±10分)
-            if pe:
-                if 10 < pe < 20:  # 合理区间
-                    score += 10
-                elif 20 <= pe < 30:
-                    score += 5
-                elif pe >= 50:  # 过高
-                    score -= 10
-
-            # 换手率评分 (±5分)
-            if turnover:
-                if 1 < turnover < 5:  # 适中
-                    score += 5
-                elif turnover > 20:  # 过度投机
-                    score -= 5
-
-        except:
-            pass
-
-        return max(0, min(100, score))  # 限制在0-100之间
+        return calculate_financial_health(pb, div_yield, pe, turnover)
 
     def get_stock_historical_data(self, stock_code: str, days: int = 30) -> pd.DataFrame:
-        """获取股票历史数据 - 使用腾讯财经API，带重试机制和缓存"""
-        import requests
-
-        max_retries = 5  # 增加重试次数
-
-        for attempt in range(max_retries):
-            try:
-                # 简单的内存缓存key
-                cache_key = f"{stock_code}_{days}"
-                cache_time = 3600  # 缓存1小时
-
-                # 检查内存缓存
-                if not hasattr(self, '_hist_cache'):
-                    self._hist_cache = {}
-
-                if cache_key in self._hist_cache:
-                    cached_data, cached_time = self._hist_cache[cache_key]
-                    if time.time() - cached_time < cache_time:
-                        return cached_data
-
-                # 添加随机延迟
-                if attempt > 0:
-                    self._random_delay(0.5, 1.5)
-
-                # 构造腾讯财经历史数据API请求
-                # 确定市场代码
-                if stock_code.startswith('6'):
-                    market = 'sh'
-                elif stock_code.startswith('0') or stock_code.startswith('3'):
-                    market = 'sz'
-                else:
-                    market = 'sz'
-
-                symbol = f"{market}{stock_code}"
-
-                # 腾讯财经日K线数据接口
-                # 获取更多天数以确保有足够的交易日数据
-                actual_days = int(days * 2)  # 获取更多数据
-
-                url = f"https://web.ifzq.gtimg.cn/appstock/app/fqkline/get"
-                params = {
-                    'param': f'{symbol},day,,,{actual_days},qfq',  # qfq=前复权
-                    '_var': 'kline_dayqfq'
-                }
-
-                headers = {
-                    'User-Agent': self._get_random_user_agent(),
-                    'Accept': '*/*',
-                    'Accept-Encoding': 'gzip, deflate, br',
-                    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                    'Connection': 'keep-alive',
-                    'Referer': 'https://gu.qq.com/'
-                }
+        """获取股票历史数据 - 读本地K线库，只下载上次同步后缺失的K线"""
+        try:
+            # 简单的内存缓存key
+            cache_key = f"{stock_code}_{days}"
+            cache_time = 3600  # 缓存1小时
+
+            # 检查内存缓存
+            if cache_key in self._hist_cache:
+                cached_data, cached_time = self._hist_cache[cache_key]
+                if time.time() - cached_time < cache_time:
+                    return cached_data
+
+            headers = {
+                'User-Agent': self._get_random_user_agent(),
+                'Accept': '*/*',
+                'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+                'Referer': 'https://gu.qq.com/'
+            }
 
-                response = requests.get(url, params=params, headers=headers, timeout=20)
+            # 按自然日取3倍窗口，保证覆盖足够的交易日
+            start = (datetime.now() - timedelta(days=days * 3)).strftime('%Y-%m-%d')
+            updated = self.kline_store.update(stock_code, start, headers=headers)
+            if not updated:
+                logger.debug(f"股票 {stock_code} K线更新失败，使用本地已有数据")
+            data = self.kline_store.load_frame(stock_code, start).tail(days).reset_index()
+            if not data.empty:
+                # 存入缓存（旧数据不缓存，下次调用重新尝试更新）
+                if updated:
+                    self._hist_cache[cache_key] = (data, time.time())
+                return data
 
-                if response.status_code == 200:
-                    content = response.text
-
-                    # 解析腾讯返回的数据（JSON格式，带JavaScript变量名）
-                    if 'kline_dayqfq=' in content:
-                        json_str = content.replace('kline_dayqfq=', '')
-                        import json
-                        data_json = json.loads(json_str)
-
-                        if 'data' in data_json and symbol in data_json['data']:
-                            kline_data = data_json['data'][symbol]
-
-                            if 'qfqday' in kline_data and kline_data['qfqday']:
-                                # 解析K线数据
-                                # 数据格式: ['日期', '开盘', '收盘', '最高', '最低', '成交量']
-                                klines = kline_data['qfqday']
-
-                                if not klines:
-                                    if attempt < max_retries - 1:
-                                        backoff_time = (2 ** attempt) + random.uniform(0, 1)
-                                        logger.debug(f"股票 {stock_code} 历史数据为空，等待 {backoff_time:.2f} 秒后重试...")
-                                        time.sleep(backoff_time)
-                                        continue
-                                    return pd.DataFrame()
-
-                                # 转换为DataFrame
-                                df_data = []
-                                for kline in klines:
-                                    # kline格式: ['2024-01-01', '10.50', '10.80', '10.90', '10.40', '1000000']
-                                    df_data.append({
-                                        'date': kline[0],
-                                        'open': float(kline[1]),
-                                        'close': float(kline[2]),
-                                        'high': float(kline[3]),
-                                        'low': float(kline[4]),
-                                        'volume': float(kline[5]) if len(kline) > 5 else 0
-                                    })
-
-                                data = pd.DataFrame(df_data)
-                                data['date'] = pd.to_datetime(data['date'])
-
-                                # 只保留最近指定天数的数据
-                                if len(data) > days:
-                                    data = data.tail(days)
-
-                                # 存入缓存
-                                self._hist_cache[cache_key] = (data, time.time())
-
-                                return data
-
-                # 如果响应不成功，等待后重试
-                if attempt < max_retries - 1:
-                    backoff_time = (2 ** attempt) + random.uniform(0, 1)
-                    logger.debug(f"股票 {stock_code} 历史数据获取失败，等待 {backoff_time:.2f} 秒后重试...")
-                    time.sleep(backoff_time)
-                    continue
-
-            except Exception as e:
-                logger.warning(f"获取股票 {stock_code} 历史数据失败 (尝试 {attempt + 1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    backoff_time = (2 ** attempt) + random.uniform(0, 1)
-                    time.sleep(backoff_time)
-                    continue
+        except Exception as e:
+            logger.warning(f"获取股票 {stock_code} 历史数据失败: {e}")
 
-        # 所有重试失败后记录
-        if stock_code not in self.failed_stocks:
-            self.failed_stocks.append(stock_code)
-        logger.error(f"获取股票 {stock_code} 历史数据失败，已重试 {max_retries} 次")
+        # 失败后记录
+        self._record_failure(stock_code)
+        logger.error(f"获取股票 {stock_code} 历史数据失败")
         return pd.DataFrame()
 
+    def _record_failure(self, stock_code: str):
+        """记录失败的股票（线程安全，去重）"""
+        with self._failed_lock:
+            if stock_code not in self.failed_stocks:
+                self.failed_stocks.append(stock_code)
+
     def calculate_momentum(self, price_data: pd.DataFrame, days: int = 20) -> float:
         """计算股票动量指标"""
         if len(price_data) < days:
@@ -620,8 +289,6 @@ class StockDataFetcher:
     def get_market_overview(self) -> Dict:
         """获取市场概况 - 真实统计全市场涨跌数据"""
         try:
-            import requests
-
             try:
                 # 使用腾讯财经API获取市场概况
                 logger.info("正在获取市场概况数据(腾讯财经API)...")
@@ -632,7 +299,8 @@ class StockDataFetcher:
                     'User-Agent': self._get_random_user_agent(),
                     'Referer': 'https://gu.qq.com/'
                 }
-                response = requests.get(url, headers=headers, timeout=10)
+                throttle(url)
+                response = http_get(url, headers=headers, timeout=10)
 
                 index_data = []
                 if response.status_code == 200 and 'v_' in response.text:
@@ -690,7 +358,8 @@ class StockDataFetcher:
                     batch_url = f"https://qt.gtimg.cn/q={','.join(symbols)}"
 
                     try:
-                        batch_response = requests.get(batch_url, headers=headers, timeout=30)
+                        throttle(batch_url)
+                        batch_response = http_get(batch_url, headers=headers, timeout=30)
 
                         if batch_response.status_code == 200:
                             lines = batch_response.text.strip().split(';')
@@ -719,10 +388,6 @@ class StockDataFetcher:
                         progress = min(i + batch_size, len(stock_codes))
                         logger.info(f"市场统计进度: {progress}/{len(stock_codes)} ({progress/len(stock_codes)*100:.1f}%)")
 
-                        # 批次间延迟,避免限流
-                        if i + batch_size < len(stock_codes):
-                            time.sleep(0.5)
-
                     except Exception as batch_error:
                         logger.warning(f"批次 {i}-{i+batch_size} 获取失败: {batch_error}")
                         continue
@@ -799,101 +464,100 @@ class StockDataFetcher:
                 'error': str(e)
             }
 
-    def batch_get_stock_data(self, stock_codes: List[str], calculate_momentum: bool = True,
-                            include_fundamental: bool = True) -> List[Dict]:
-        """批量获取股票数据 - 带失败重试机制,包含基本面数据"""
-        results = []
-        seen_codes = set()  # 用于去重
+    def _fetch_one_stock(self, code: str, record: Optional[QuoteRecord], calculate_momentum: bool,
+                         include_fundamental: bool):
+        """
+        获取单只股票的完整数据（在线程池中执行，各请求由并发控制器限流）
+
+        Returns:
+            (股票数据或None, 动量是否成功, 基本面是否成功)，未计算的项为None
+        """
+        # 获取实时数据
+        realtime_data = record.to_realtime_dict() if record else self.get_stock_realtime_data(code)
+        if not realtime_data:
+            return None, None, None
+
+        # 获取行业信息
+        industry = self.get_stock_industry_info(code)
+        realtime_data['industry'] = industry
+
+        # 计算20日动量
+        momentum_ok = None
+        if calculate_momentum:
+            try:
+                # 获取历史数据计算动量
+                historical_data = self.get_stock_historical_data(code, days=30)
+                if not historical_data.empty and len(historical_data) >= 20:
+                    realtime_data['momentum_20d'] = self.calculate_momentum(historical_data, days=20)
+                    momentum_ok = True
+                else:
+                    realtime_data['momentum_20d'] = 0
+                    momentum_ok = False
+                    logger.debug(f"{code} 历史数据不足20天，动量设为0 (数据量:{len(historical_data) if not historical_data.empty else 0})")
+            except Exception as e:
+                logger.warning(f"计算 {code} 动量失败: {e}")
+                realtime_data['momentum_20d'] = 0
+                momentum_ok = False
+        else:
+            realtime_data['momentum_20d'] = 0
+
+        # 获取基本面数据
+        fundamental_ok = None
+        if include_fundamental:
+            fundamental_ok = False
+            try:
+                if record and record.field_count > 52:
+                    fundamental_data = record.to_fundamental_dict()
+                else:
+                    fundamental_data = self.get_stock_fundamental_data(code)
+                if fundamental_data:
+                    realtime_data.update(fundamental_data)
+                    # 判断是否成功获取了关键指标
+                    fundamental_ok = (fundamental_data.get('roe') is not None
+                                      or fundamental_data.get('pb_ratio') is not None)
+            except Exception as e:
+                logger.warning(f"获取 {code} 基本面数据失败: {e}")
 
-        # 统计动量计算情况
-        momentum_success = 0
-        momentum_fail = 0
+        return realtime_data, momentum_ok, fundamental_ok
 
-        # 统计基本面数据获取情况
-        fundamental_success = 0
-        fundamental_fail = 0
+    def batch_get_stock_data(self, stock_codes: List[str], calculate_momentum: bool = True,
+                            include_fundamental: bool = True) -> List[Dict]:
+        """
+        批量获取股票数据 - 带失败重试机制,包含基本面数据
 
+        逐只请求在线程池中并发执行，实际并发数由AIMD控制器按接口延迟和失败情况自适应调整
+        （替代原先每只股票之间的随机延时）
+        """
         # 清空失败列表
         self.failed_stocks = []
 
-        for i, code in enumerate(stock_codes):
-            try:
-                # 去重检查
-                if code in seen_codes:
-                    logger.warning(f"跳过重复股票: {code}")
-                    continue
-
-                # 获取实时数据
-                realtime_data = self.get_stock_realtime_data(code)
-                if not realtime_data:
-                    continue
-
-                # 获取行业信息
-                industry = self.get_stock_industry_info(code)
-                realtime_data['industry'] = industry
+        # 去重
+        unique_codes = list(dict.fromkeys(stock_codes))
+        if len(unique_codes) < len(stock_codes):
+            logger.warning(f"跳过重复股票 {len(stock_codes) - len(unique_codes)} 只")
 
-                # 计算20日动量
-                if calculate_momentum:
-                    try:
-                        # 获取历史数据计算动量
-                        historical_data = self.get_stock_historical_data(code, days=30)
-                        if not historical_data.empty and len(historical_data) >= 20:
-                            momentum = self.calculate_momentum(historical_data, days=20)
-                            realtime_data['momentum_20d'] = momentum
-                            momentum_success += 1
-                            if (i + 1) % 50 == 0:
-                                logger.info(f"动量计算进度: {momentum_success}成功/{momentum_fail}失败")
-                        else:
-                            realtime_data['momentum_20d'] = 0
-                            momentum_fail += 1
-                            logger.debug(f"{code} 历史数据不足20天，动量设为0 (数据量:{len(historical_data) if not historical_data.empty else 0})")
-                    except Exception as e:
-                        logger.warning(f"计算 {code} 动量失败: {e}")
-                        realtime_data['momentum_20d'] = 0
-                        momentum_fail += 1
-                else:
-                    realtime_data['momentum_20d'] = 0
-
-                # 获取基本面数据
-                if include_fundamental:
-                    try:
-                        fundamental_data = self.get_stock_fundamental_data(code)
-                        if fundamental_data:
-                            realtime_data.update(fundamental_data)
-                            # 判断是否成功获取了关键指标
-                            if fundamental_data.get('roe') is not None or fundamental_data.get('pb_ratio') is not None:
-                                fundamental_success += 1
-                            else:
-                                fundamental_fail += 1
-                        else:
-                            fundamental_fail += 1
-                    except Exception as e:
-                        logger.warning(f"获取 {code} 基本面数据失败: {e}")
-                        fundamental_fail += 1
-
-                results.append(realtime_data)
-                seen_codes.add(code)  # 记录已处理的股票代码
-
-                # 优化请求间隔时间，更好地防止限流
-                # 使用随机延迟模拟人工操作
-                if calculate_momentum:
-                    if (i + 1) % 3 == 0:
-                        # 每处理3只股票暂停较长时间
-                        self._random_delay(1.5, 3.0)
-                    else:
-                        # 正常随机间隔
-                        self._random_delay(0.5, 1.2)
-                else:
-                    if (i + 1) % 10 == 0:
-                        self._random_delay(1.0, 2.0)
-                    else:
-                        self._random_delay(0.3, 0.8)
+        # 批量预取行情记录（每次请求查询多只股票），实时和基本面共用，缺失的股票逐只补取
+        records = self.get_quote_records_batch(unique_codes)
 
+        def fetch(code):
+            try:
+                return self._fetch_one_stock(code, records.get(code), calculate_momentum, include_fundamental)
             except Exception as e:
                 logger.error(f"批量获取股票 {code} 数据失败: {e}")
-                continue
+                return None, None, None
 
-        logger.info(f"批量获取完成，去重前: {len(stock_codes)}只，去重后: {len(results)}只")
+        with ThreadPoolExecutor(max_workers=self.concurrency.max_limit) as pool:
+            outcomes = list(pool.map(fetch, unique_codes))
+
+        results = [data for data, _, _ in outcomes if data]
+        momentum_flags = [ok for data, ok, _ in outcomes if data and ok is not None]
+        fundamental_flags = [ok for data, _, ok in outcomes if data and ok is not None]
+        momentum_success = sum(momentum_flags)
+        momentum_fail = len(momentum_flags) - momentum_success
+        fundamental_success = sum(fundamental_flags)
+        fundamental_fail = len(fundamental_flags) - fundamental_success
+
+        logger.info(f"批量获取完成，去重前: {len(stock_codes)}只，去重后: {len(results)}只, {self.concurrency.stats()}")
         if calculate_momentum:
             logger.info(f"20日动量计算结果: 成功{momentum_success}只，失败{momentum_fail}只")
         if include_fundamental:
@@ -964,9 +628,6 @@ class StockDataFetcher:
                 retry_results.append(realtime_data)
                 logger.info(f"重试成功: {code} ({i+1}/{len(failed_codes)})")
 
-                # 重试时使用更保守的延迟
-                self._random_delay(2.0, 4.0)
-
             except Exception as e:
                 logger.error(f"重试股票 {code} 仍然失败: {e}")
                 continue
@@ -1,10 +1,14 @@
 import akshare as ak
+import numpy as np
 import pandas as pd
 import json
 import os
 import logging
 from datetime import date
-from typing import Dict, Optional
+from typing import Dict, Iterable, Optional
+
+from src.data.array_cache import ArrayCache
+from src.data.rate_limit import throttle
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +16,18 @@ _financial_cache: Optional[Dict[str, Dict]] = None
 _cache_date: Optional[str] = None
 
 CACHE_DIR = './cache/financial_reports'
+REPORT_TABLE_DIR = os.path.join(CACHE_DIR, 'yjbb')
+REPORT_HOST = 'datacenter-web.eastmoney.com'  # stock_yjbb_em 数据所在主机（按 RATE_LIMITS 限速）
+
+# stock_yjbb_em 列名 -> 财报字段
+REPORT_COLUMNS = {
+    '净资产收益率': 'roe',
+    '净利润-同比增长': 'profit_growth',
+    '每股收益': 'eps',
+    '每股净资产': 'bvps',
+}
+
+_report_cache: Optional[ArrayCache] = None
 
 
 def get_financial_data_map() -> Dict[str, Dict]:
@@ -77,47 +93,130 @@ def _load_csi300_codes() -> set:
 def _fetch_roe(target_codes: set) -> Dict[str, float]:
     """获取年报ROE，回退: 20251231 -> 20250630"""
     for report_date in ['20251231', '20250630']:
-        try:
-            logger.info(f"正在获取{report_date}年报ROE...")
-            df = ak.stock_yjbb_em(date=report_date)
-            if df is not None and not df.empty:
-                roe_map = {}
-                for _, row in df.iterrows():
-                    code = str(row['股票代码']).zfill(6)
-                    if target_codes and code not in target_codes:
-                        continue
-                    roe_val = row.get('净资产收益率')
-                    if pd.notna(roe_val) and -100 < float(roe_val) < 200:
-                        roe_map[code] = float(roe_val)
-                logger.info(f"成功获取{report_date} ROE: {len(roe_map)}只")
-                return roe_map
-        except Exception as e:
-            logger.warning(f"获取{report_date}年报失败: {e}")
+        logger.info(f"正在获取{report_date}年报ROE...")
+        table = load_report_table(report_date)
+        if table is not None and not table.empty:
+            roe = _filter_codes(table, target_codes)['roe']
+            roe = roe[roe.notna() & (roe > -100) & (roe < 200)]
+            logger.info(f"成功获取{report_date} ROE: {len(roe)}只")
+            return dict(zip(roe.index, roe.tolist()))
     return {}
 
 
 def _fetch_profit_growth(target_codes: set) -> Dict[str, float]:
     """获取最新季报净利润增长率，回退: 20260331 -> 20251231 -> 20250930"""
     for report_date in ['20260331', '20251231', '20250930']:
-        try:
-            logger.info(f"正在获取{report_date}净利润增长率...")
-            df = ak.stock_yjbb_em(date=report_date)
-            if df is not None and not df.empty:
-                growth_map = {}
-                for _, row in df.iterrows():
-                    code = str(row['股票代码']).zfill(6)
-                    if target_codes and code not in target_codes:
-                        continue
-                    val = row.get('净利润-同比增长')
-                    if pd.notna(val):
-                        growth_map[code] = float(val)
-                logger.info(f"成功获取{report_date}增长率: {len(growth_map)}只")
-                return growth_map
-        except Exception as e:
-            logger.warning(f"获取{report_date}季报失败: {e}")
+        logger.info(f"正在获取{report_date}净利润增长率...")
+        table = load_report_table(report_date)
+        if table is not None and not table.empty:
+            growth = _filter_codes(table, target_codes)['profit_growth'].dropna()
+            logger.info(f"成功获取{report_date}增长率: {len(growth)}只")
+            return dict(zip(growth.index, growth.tolist()))
     return {}
 
 
+def _filter_codes(table: pd.DataFrame, codes: Optional[Iterable[str]]) -> pd.DataFrame:
+    """按股票池过滤报表（codes为空时不过滤）"""
+    if not codes:
+        return table
+    return table[table.index.isin(list(codes))]
+
+
+def normalize_report_table(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    stock_yjbb_em 原始报表 -> 以6位股票代码为索引、REPORT_COLUMNS 字段为列的float表
+
+    非数值记为NaN；同一代码出现多行时保留最后一行
+    """
+    codes = df['股票代码'].astype(str).str.zfill(6)
+    table = pd.DataFrame({
+        field: pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=np.float64)
+        if column in df else np.full(len(df), np.nan)
+        for column, field in REPORT_COLUMNS.items()
+    }, index=pd.Index(codes.to_numpy(), name='code'))
+    return table[~table.index.duplicated(keep='last')]
+
+
+def disclosure_deadline(report_date: str) -> date:
+    """报告期的法定披露截止日：一季报4/30、半年报8/31、三季报10/31、年报次年4/30"""
+    year, month = int(report_date[:4]), int(report_date[4:6])
+    if month == 3:
+        return date(year, 4, 30)
+    if month == 6:
+        return date(year, 8, 31)
+    if month == 9:
+        return date(year, 10, 31)
+    return date(year + 1, 4, 30)
+
+
+def load_report_table(report_date: str) -> Optional[pd.DataFrame]:
+    """
+    某报告期全市场业绩报表（列为 REPORT_COLUMNS 字段）
+
+    每个报告期解析一次后持久化：披露截止日之后获取的报表不再变化，永久复用；
+    截止日之前仍有公司陆续披露，缓存当天有效。获取或解析失败时退回旧缓存，都没有返回None
+    """
+    global _report_cache
+    if _report_cache is None:
+        _report_cache = ArrayCache(REPORT_TABLE_DIR)
+    key = f'yjbb_{report_date}'
+
+    cached = _report_cache.load(key)
+    if cached is not None:
+        index, arrays = cached
+        if index.get('final') or _report_cache.is_fresh(key, 1):
+            return _table_from_arrays(index, arrays)
+
+    throttle(REPORT_HOST)
+    table = None
+    try:
+        df = ak.stock_yjbb_em(date=report_date)
+        if df is not None and not df.empty:
+            # 表结构异常（缺少股票代码列等）或报告期格式错误同样视为获取失败
+            table = normalize_report_table(df)
+            final = date.today() > disclosure_deadline(report_date)
+    except Exception as e:
+        logger.warning(f"获取{report_date}业绩报表失败: {e}")
+        table = None
+
+    if table is None:
+        return _table_from_arrays(*cached) if cached is not None else None
+
+    try:
+        _report_cache.save(key, {field: table[field].to_numpy() for field in REPORT_COLUMNS.values()},
+                           {'codes': table.index.tolist(), 'final': final})
+    except Exception as e:
+        logger.warning(f"写入{report_date}业绩报表缓存失败: {e}")
+    return table
+
+
+def _table_from_arrays(index: Dict, arrays: Dict[str, np.ndarray]) -> pd.DataFrame:
+    return pd.DataFrame({field: np.asarray(arrays[field]) for field in REPORT_COLUMNS.values()},
+                        index=pd.Index(index['codes'], name='code'))
+
+
+def load_report_fin_data(report_dates: Iterable[str], codes: Optional[Iterable[str]] = None) -> Dict:
+    """
+    多个报告期的财报字段，只保留股票池内的股票
+
+    Returns:
+        {code: {报告期: {'roe', 'profit_growth', 'eps', 'bvps'}}}，缺失字段为None
+    """
+    codes = list(codes) if codes is not None else None
+    fields = list(REPORT_COLUMNS.values())
+    fin_data = {}
+    for rd in report_dates:
+        table = load_report_table(rd)
+        if table is None:
+            continue
+        table = _filter_codes(table, codes)
+        for code, values in zip(table.index, table[fields].to_numpy().tolist()):
+            fin_data.setdefault(code, {})[rd] = {
+                field: None if v != v else v for field, v in zip(fields, values)
+            }
+    return fin_data
+
+
 def _cleanup_old_cache():
     """清理7天前的缓存文件"""
     if not os.path.exists(CACHE_DIR):
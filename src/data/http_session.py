@@ -0,0 +1,68 @@
+"""
+同步HTTP连接池
+
+进程内共用 requests.Session，按主机挂载 HTTPAdapter（连接池大小见 config.HTTP_POOLS），
+keep-alive 复用TCP/TLS连接，避免每次请求重新握手。适配器只对连接建立失败、
+复用的空闲连接被服务端关闭等传输层错误做少量重试（config.HTTP_RETRY），
+非200等业务层重试仍由各调用方负责（并反馈给并发控制器）。
+"""
+import os
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config.config import HTTP_POOLS, HTTP_RETRY
+
+_session: Optional[requests.Session] = None
+_session_pid: Optional[int] = None
+_host_sessions: Dict[str, requests.Session] = {}  # 未配置主机各自的Session
+_lock = threading.Lock()
+
+
+def _make_adapter(host: str) -> HTTPAdapter:
+    pool = HTTP_POOLS.get(host, HTTP_POOLS['default'])
+    retry = Retry(allowed_methods=frozenset(['GET', 'HEAD']), raise_on_status=False, **HTTP_RETRY)
+    return HTTPAdapter(pool_connections=1, pool_maxsize=pool['pool_maxsize'], max_retries=retry)
+
+
+def _new_session(hosts) -> requests.Session:
+    """创建Session并一次性挂载各主机的连接池（发布后不再 mount，避免与并发请求遍历适配器冲突）"""
+    session = requests.Session()
+    for host in hosts:
+        for scheme in ('http', 'https'):
+            session.mount(f'{scheme}://{host}', _make_adapter(host))
+    return session
+
+
+def get_session(url: Optional[str] = None) -> requests.Session:
+    """
+    进程内共享的Session（fork出的子进程重新创建，不共用父进程的连接）
+
+    HTTP_POOLS 中配置的主机共用一个Session，创建时全部挂载；其他主机首次请求时
+    各自创建一个挂载好连接池的Session，已在使用的Session不会被修改
+
+    Args:
+        url: 将要请求的URL
+    """
+    global _session, _session_pid
+    with _lock:
+        if _session is None or _session_pid != os.getpid():
+            _session = _new_session(host for host in HTTP_POOLS if host != 'default')
+            _session_pid = os.getpid()
+            _host_sessions.clear()
+        host = urlsplit(url).hostname if url else None
+        if not host or host in HTTP_POOLS:
+            return _session
+        session = _host_sessions.get(host)
+        if session is None:
+            session = _host_sessions[host] = _new_session([host])
+        return session
+
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    """经连接池发送GET请求，参数同 requests.get"""
+    return get_session(url).get(url, **kwargs)
@@ -0,0 +1,382 @@
+"""
+本地日K线存储（前复权OHLCV）
+
+每只股票一个 .npz 文件，按列存储 date/open/close/high/low/volume，
+并记录已覆盖的日期区间。实盘分析和回测共用同一份数据，
+每次只下载上次同步之后缺失的K线。
+
+前复权价格在除权除息后会整体变化，增量更新时用已存储的倒数第二根K线
+（最后一根可能是盘中未收盘数据）做锚点校验，价格不一致说明发生了复权调整，
+此时整段重新下载。
+
+同时记录最近一次下载的时间：最后一根是当天K线且下载于收盘前时，
+当天再次同步会重新下载它，不会停留在盘中价格。
+"""
+import json
+import logging
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from datetime import date, datetime, time as dt_time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.data.http_session import http_get
+from src.data.quote_engine import to_symbol
+from src.data.rate_limit import throttle
+
+logger = logging.getLogger(__name__)
+
+KLINE_URL = 'https://web.ifzq.gtimg.cn/appstock/app/fqkline/get'
+KLINE_MAX_BARS = 800  # 接口单次最多返回的K线数量（更长的区间分段下载）
+MAX_CHUNK_WORKERS = 8  # 单只股票分段下载的并发线程数（update_many 中各段串行）
+STORE_DIR = './cache/kline'
+FIELDS = ('open', 'close', 'high', 'low', 'volume')
+ANCHOR_TOLERANCE = 1e-4  # 锚点收盘价相对误差容忍度
+MARKET_CLOSE = dt_time(15, 0)  # 收盘时间，此后下载的当天K线视为已收盘
+
+
+def build_kline_url(symbol: str, start: str = '', end: str = '', count: int = KLINE_MAX_BARS) -> str:
+    """构造前复权日K线请求URL（start/end格式YYYY-MM-DD，留空表示不限）"""
+    return f"{KLINE_URL}?param={symbol},day,{start},{end},{count},qfq"
+
+
+def estimate_bar_count(start: str, end: str) -> int:
+    """按自然日估算区间内K线数量上限（交易日不多于自然日）"""
+    days = (_parse_date(end) - _parse_date(start)).days + 1
+    return max(1, min(days, KLINE_MAX_BARS))
+
+
+def split_range(start: str, end: str, max_bars: int = KLINE_MAX_BARS) -> List[Tuple[str, str]]:
+    """
+    把下载区间按自然日切分为每段不超过 max_bars 天的连续子区间
+
+    交易日不多于自然日，每段一次请求不会被单次返回上限截断；区间不足一段时原样返回
+    """
+    start_d, end_d = _parse_date(start), _parse_date(end)
+    chunks = []
+    while start_d <= end_d:
+        chunk_end = min(start_d + timedelta(days=max_bars - 1), end_d)
+        chunks.append((_format_date(start_d), _format_date(chunk_end)))
+        start_d = chunk_end + timedelta(days=1)
+    return chunks or [(start, end)]
+
+
+def stitch_chunks(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """拼接分段下载的K线，按日期去重（保留后一段）并排序"""
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        return pd.DataFrame(columns=list(FIELDS))
+    merged = pd.concat(frames)
+    return merged[~merged.index.duplicated(keep='last')].sort_index()
+
+
+def parse_kline_response(content: str, symbol: str) -> pd.DataFrame:
+    """
+    解析K线接口响应
+
+    Returns:
+        以date为索引、包含open/close/high/low/volume列的DataFrame，无数据返回空DataFrame
+    """
+    # 带 _var 参数时响应形如 kline_dayqfq={...}
+    if not content.lstrip().startswith('{'):
+        content = content.split('=', 1)[1]
+    data = json.loads(content)
+    stock_data = (data.get('data') or {}).get(symbol) or {}
+    klines = stock_data.get('qfqday') or stock_data.get('day') or []
+    if not klines:
+        return pd.DataFrame(columns=list(FIELDS))
+
+    rows = [row[:6] for row in klines if len(row) >= 6]
+    df = pd.DataFrame(rows, columns=['date'] + list(FIELDS))
+    df['date'] = pd.to_datetime(df['date'])
+    for col in FIELDS:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df.drop_duplicates('date', keep='last').set_index('date').sort_index()
+
+
+def _parse_date(value) -> date:
+    if isinstance(value, str):
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _format_date(value) -> str:
+    return _parse_date(value).strftime('%Y-%m-%d')
+
+
+class KlineStore:
+    """按股票代码存储的本地日K线库"""
+
+    def __init__(self, store_dir: str = STORE_DIR, concurrency=None):
+        """
+        Args:
+            concurrency: 同步下载使用的并发控制器（src.data.concurrency.AIMDController），可选
+        """
+        self.store_dir = store_dir
+        self.concurrency = concurrency
+        os.makedirs(store_dir, exist_ok=True)
+
+    def _path(self, code: str) -> str:
+        return os.path.join(self.store_dir, f'{code}.npz')
+
+    def load(self, code: str) -> Optional[Dict]:
+        """读取原始存储：{'bars': DataFrame, 'covered_from': str, 'synced_to': str, 'fetched_at': datetime或None}"""
+        path = self._path(code)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                bars = pd.DataFrame({col: npz[col] for col in FIELDS},
+                                    index=pd.DatetimeIndex(npz['date'].astype('datetime64[ns]'), name='date'))
+                return {
+                    'bars': bars,
+                    'covered_from': str(npz['covered_from']),
+                    'synced_to': str(npz['synced_to']),
+                    # 旧版本文件没有下载时间，按未收盘处理
+                    'fetched_at': (datetime.fromisoformat(str(npz['fetched_at']))
+                                   if 'fetched_at' in npz.files else None),
+                }
+        except Exception as e:
+            logger.warning(f"读取K线存储 {code} 失败，将重新下载: {e}")
+            return None
+
+    def save(self, code: str, bars: pd.DataFrame, covered_from: str, synced_to: str,
+             fetched_at: Optional[datetime] = None):
+        """原子写入（先写临时文件再替换），fetched_at 为K线的下载时间（默认当前时间）"""
+        arrays = {col: bars[col].to_numpy(dtype=np.float64) for col in FIELDS}
+        arrays['date'] = bars.index.values.astype('datetime64[D]')
+        arrays['covered_from'] = np.array(covered_from)
+        arrays['synced_to'] = np.array(synced_to)
+        arrays['fetched_at'] = np.array((fetched_at or datetime.now()).isoformat())
+        path = self._path(code)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    def load_frame(self, code: str, start: Optional[str] = None,
+                   end: Optional[str] = None) -> pd.DataFrame:
+        """读取指定区间的K线（date索引，open/close/high/low/volume列）"""
+        stored = self.load(code)
+        if stored is None:
+            return pd.DataFrame(columns=list(FIELDS))
+        bars = stored['bars']
+        if start:
+            bars = bars[bars.index >= pd.Timestamp(start)]
+        if end:
+            bars = bars[bars.index <= pd.Timestamp(end)]
+        return bars
+
+    def plan_update(self, code: str, start: str, end: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        """
+        计算需要下载的区间
+
+        Returns:
+            (下载起始日, 下载截止日)，本地已覆盖时返回None
+        """
+        today = date.today()
+        end_d = min(_parse_date(end), today) if end else today
+        start_d = _parse_date(start)
+
+        stored = self.load(code)
+        if stored is None or stored['bars'].empty:
+            return _format_date(start_d), _format_date(end_d)
+
+        covered_from = _parse_date(stored['covered_from'])
+        synced_to = _parse_date(stored['synced_to'])
+
+        if start_d < covered_from:
+            # 需要补更早的历史：整段重下（与已有数据合并时做复权校验）
+            return _format_date(start_d), _format_date(max(end_d, synced_to))
+        if end_d > synced_to or (end_d == today and self._tail_intraday(stored, today)):
+            # 增量追加：从倒数第二根K线开始，既作复权锚点又覆盖可能未收盘的最后一根
+            index = stored['bars'].index
+            anchor = index[-2] if len(index) >= 2 else index[-1]
+            return _format_date(anchor), _format_date(end_d)
+        return None
+
+    @staticmethod
+    def _tail_intraday(stored: Dict, today: date) -> bool:
+        """最后一根是当天K线且下载于收盘前（仍是盘中价格，需要重新下载）"""
+        if stored['bars'].index[-1].date() != today:
+            return False
+        fetched_at = stored['fetched_at']
+        return fetched_at is None or fetched_at < datetime.combine(today, MARKET_CLOSE)
+
+    def apply_update(self, code: str, new_bars: pd.DataFrame, fetch_start: str, fetch_end: str,
+                     fetched_at: Optional[datetime] = None) -> bool:
+        """
+        合并新下载的K线（fetched_at 为发起下载的时间）
+
+        Returns:
+            False表示锚点价格不一致（已发生复权调整），调用方需整段重新下载后调用replace
+        """
+        stored = self.load(code)
+        if stored is None or stored['bars'].empty:
+            self.save(code, new_bars, fetch_start, fetch_end, fetched_at)
+            return True
+
+        old = stored['bars']
+        if not new_bars.empty:
+            # 复权校验：重叠区间内（排除旧数据最后一根可能未收盘的K线）收盘价必须一致
+            common = old.index[:-1].intersection(new_bars.index)
+            if len(common):
+                old_close = old.loc[common, 'close'].to_numpy()
+                new_close = new_bars.loc[common, 'close'].to_numpy()
+                if np.any(np.abs(new_close / old_close - 1) > ANCHOR_TOLERANCE):
+                    logger.info(f"{code} 前复权价格已调整，需要整段重新下载")
+                    return False
+
+            merged = pd.concat([
+                old[old.index < new_bars.index[0]],
+                new_bars,
+                old[old.index > new_bars.index[-1]],
+            ])
+        else:
+            merged = old
+
+        covered_from = min(_parse_date(stored['covered_from']), _parse_date(fetch_start))
+        synced_to = max(_parse_date(stored['synced_to']), _parse_date(fetch_end))
+        self.save(code, merged, _format_date(covered_from), _format_date(synced_to), fetched_at)
+        return True
+
+    def replace(self, code: str, new_bars: pd.DataFrame, fetch_start: str, fetch_end: str,
+                fetched_at: Optional[datetime] = None):
+        """用整段重新下载的K线替换本地数据"""
+        self.save(code, new_bars, fetch_start, fetch_end, fetched_at)
+
+    def covers(self, code: str, start: str, end: Optional[str] = None) -> bool:
+        """本地数据是否已覆盖[start, end]（不含当天未收盘K线的刷新，见 plan_update）"""
+        stored = self.load(code)
+        if stored is None or stored['bars'].empty:
+            return False
+        today = date.today()
+        end_d = min(_parse_date(end), today) if end else today
+        return (_parse_date(stored['covered_from']) <= _parse_date(start)
+                and _parse_date(stored['synced_to']) >= end_d)
+
+    def full_range(self, code: str, start: str, end: str) -> Tuple[str, str]:
+        """复权调整后需要整段重下的区间：已覆盖区间与请求区间的并集"""
+        stored = self.load(code)
+        if stored is None:
+            return start, end
+        return (_format_date(min(_parse_date(stored['covered_from']), _parse_date(start))),
+                _format_date(max(_parse_date(stored['synced_to']), _parse_date(end))))
+
+    def _download(self, code: str, start: str, end: str, headers: Optional[Dict] = None,
+                  parallel: bool = True) -> Optional[pd.DataFrame]:
+        """
+        同步下载区间K线，失败返回None
+
+        区间超过单次请求上限时按 split_range 分段下载再拼接去重，任一段失败视为整体失败（避免数据缺口）。
+        parallel 为False时各段串行下载（调用方已在线程池中按股票并发，避免每只股票再开线程池）
+        """
+        chunks = split_range(start, end)
+        if len(chunks) == 1:
+            return self._download_chunk(code, start, end, headers)
+        if parallel:
+            with ThreadPoolExecutor(max_workers=min(len(chunks), MAX_CHUNK_WORKERS)) as pool:
+                frames = list(pool.map(lambda chunk: self._download_chunk(code, *chunk, headers), chunks))
+        else:
+            frames = []
+            for chunk in chunks:
+                frames.append(self._download_chunk(code, *chunk, headers))
+                if frames[-1] is None:
+                    return None
+        if any(df is None for df in frames):
+            return None
+        return stitch_chunks(frames)
+
+    def _download_chunk(self, code: str, start: str, end: str, headers: Optional[Dict] = None,
+                        max_retries: int = 3, timeout: int = 10) -> Optional[pd.DataFrame]:
+        """单次请求下载区间K线（区间不超过 KLINE_MAX_BARS 天），失败返回None"""
+        symbol = to_symbol(code)
+        url = build_kline_url(symbol, start, end, estimate_bar_count(start, end))
+        for attempt in range(max_retries):
+            try:
+                throttle(url)
+                with self.concurrency.slot() if self.concurrency else nullcontext() as request:
+                    response = http_get(url, headers=headers, timeout=timeout)
+                    if response.status_code != 200 and request is not None:
+                        request.fail()
+                if response.status_code == 200:
+                    return parse_kline_response(response.text, symbol)
+            except Exception as e:
+                logger.debug(f"下载 {code} K线失败 (尝试 {attempt + 1}/{max_retries}): {e}")
+            if attempt < max_retries - 1:
+                time.sleep(0.5 * (2 ** attempt) + random.uniform(0, 0.5))
+        return None
+
+    def update(self, code: str, start: str, end: Optional[str] = None,
+               headers: Optional[Dict] = None, parallel: bool = True) -> bool:
+        """
+        同步本地K线到覆盖[start, end]，只下载缺失部分（parallel 见 _download）
+
+        Returns:
+            本地数据是否已覆盖请求区间（无需更新或更新成功）；下载失败时为False，
+            即使本地有旧数据（接受旧数据的调用方自行读取）
+        """
+        plan = self.plan_update(code, start, end)
+        if plan is None:
+            return True
+
+        fetch_start, fetch_end = plan
+        fetched_at = datetime.now()
+        new_bars = self._download(code, fetch_start, fetch_end, headers, parallel)
+        if new_bars is None:
+            return False
+
+        if not self.apply_update(code, new_bars, fetch_start, fetch_end, fetched_at):
+            full_start, full_end = self.full_range(code, start, fetch_end)
+            fetched_at = datetime.now()
+            new_bars = self._download(code, full_start, full_end, headers, parallel)
+            if new_bars is None:
+                return False
+            self.replace(code, new_bars, full_start, full_end, fetched_at)
+        return True
+
+    def update_many(self, codes: List[str], start: str, end: Optional[str] = None,
+                    headers: Optional[Dict] = None, max_workers: Optional[int] = None) -> List[str]:
+        """
+        并发同步多只股票的K线（线程池）
+
+        每只股票下载完成即写入本地文件，中途失败或中断后再次调用只会下载仍缺失的股票。
+        并发由构造时传入的并发控制器自适应调整（线程数为其上限），请求频率受主机令牌桶约束。
+        长区间的各段在所属股票的线程内串行下载，总线程数不超过 max_workers。
+
+        Args:
+            max_workers: 线程数，默认取并发控制器上限（无控制器时为8）
+
+        Returns:
+            同步后仍未覆盖请求区间的股票代码（按输入顺序，已去重）
+        """
+        codes = list(dict.fromkeys(codes))  # 重复代码会让多个线程同时写同一个文件
+        pending = [code for code in codes if self.plan_update(code, start, end) is not None]
+        if not pending:
+            return []
+        if max_workers is None:
+            max_workers = self.concurrency.max_limit if self.concurrency else 8
+        logger.info(f"K线同步: {len(pending)}/{len(codes)}只需要下载")
+
+        def _update(code):
+            try:
+                return self.update(code, start, end, headers=headers, parallel=False)
+            except Exception as e:
+                logger.debug(f"同步 {code} K线失败: {e}")
+                return False
+
+        ok = {}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as pool:
+            futures = {pool.submit(_update, code): code for code in pending}
+            for done, future in enumerate(as_completed(futures), 1):
+                ok[futures[future]] = future.result()
+                if done % 50 == 0:
+                    logger.info(f"  K线下载: {done}/{len(pending)}")
+        return [code for code in pending if not ok[code] or not self.covers(code, start, end)]
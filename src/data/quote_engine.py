@@ -0,0 +1,379 @@
+"""
+腾讯行情批量查询引擎
+
+qt.gtimg.cn 接口支持一次查询多只股票（symbol逗号分隔），
+一次请求即可返回上百只股票的行情，沪深300全部成分股只需3次请求。
+"""
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from config.dividend_override import get_manual_dividend_yield
+from src.data.http_session import http_get
+from src.data.rate_limit import throttle
+
+logger = logging.getLogger(__name__)
+
+QUOTE_URL = 'https://qt.gtimg.cn/q='
+QUOTE_BATCH_SIZE = 100  # 单次请求的股票数量（URL长度和响应体积的折中）
+
+
+def to_symbol(stock_code: str) -> str:
+    """股票代码转换为腾讯行情symbol（6开头为沪市，其余为深市；已带市场前缀的如指数sh000300原样返回）"""
+    if stock_code[:2] in ('sh', 'sz'):
+        return stock_code
+    if stock_code.startswith('6'):
+        return f"sh{stock_code}"
+    return f"sz{stock_code}"
+
+
+def build_quote_url(symbols: List[str]) -> str:
+    """构造批量行情查询URL"""
+    return QUOTE_URL + ','.join(symbols)
+
+
+def parse_quote_response(content: str) -> Dict[str, List[str]]:
+    """
+    解析批量行情响应
+
+    响应格式: v_sh600000="1~浦发银行~600000~...";v_sz000001="51~平安银行~000001~...";
+
+    Returns:
+        {symbol: 字段列表}，无效symbol（v_pv_none_match）被忽略
+    """
+    result = {}
+    for line in content.split(';'):
+        line = line.strip()
+        if not line.startswith('v_') or '=' not in line or '~' not in line:
+            continue
+        try:
+            symbol = line[2:line.index('=')]
+            data_str = line.split('"')[1]
+        except (ValueError, IndexError):
+            continue
+        result[symbol] = data_str.split('~')
+    return result
+
+
+@dataclass
+class QuoteRecord:
+    """
+    单只股票的行情记录，由一次行情响应解析得到，同时提供实时数据和基本面数据
+
+    腾讯API字段位置：
+    [1]名称 [3]当前价 [4]昨收 [6]成交量 [7]成交额 [14]市盈率(动) [15]市盈率(静) [16]市净率
+    [22]市盈率(TTM) [23]总市值(万元) [25]总股本(万股) [27]换手率 [32]涨跌幅 [39]基本面PE
+    [46]市净率(基本面) [53]股息(每10股) [56]换手率(基本面)
+    """
+    code: str
+    name: str
+    price: float
+    prev_close: float
+    change_pct: float
+    volume: int
+    turnover: int
+    market_cap: Optional[float] = None        # 总市值（万元）
+    total_shares: Optional[float] = None      # 总股本（万股）
+    turnover_rate: Optional[float] = None     # 换手率（字段27）
+    pe_dynamic: Optional[float] = None
+    pe_static: Optional[float] = None
+    pe_ttm: Optional[float] = None
+    pe_fundamental: Optional[float] = None    # 基本面PE（字段39）
+    pb: Optional[float] = None                # 市净率（字段16）
+    pb_fundamental: Optional[float] = None    # 市净率（字段46）
+    dividend_per_10: Optional[float] = None   # 每10股股息（字段53）
+    turnover_rate_fundamental: Optional[float] = None  # 换手率（字段56）
+    field_count: int = 0
+
+    @classmethod
+    def from_parts(cls, stock_code: str, data_parts: List[str]) -> Optional['QuoteRecord']:
+        """从行情字段列表解析，字段不足时返回None"""
+        if len(data_parts) <= 35:
+            return None
+
+        def field(idx: int) -> Optional[float]:
+            return _to_float(data_parts[idx]) if len(data_parts) > idx else None
+
+        return cls(
+            code=stock_code,
+            name=data_parts[1],
+            price=float(data_parts[3]) if data_parts[3] else 0,
+            prev_close=float(data_parts[4]) if data_parts[4] else 0,
+            change_pct=float(data_parts[32]) if data_parts[32] else 0,
+            volume=int(float(data_parts[6])) if data_parts[6] else 0,
+            turnover=int(float(data_parts[7])) if data_parts[7] else 0,
+            market_cap=field(23),
+            total_shares=field(25),
+            turnover_rate=field(27),
+            pe_dynamic=field(14),
+            pe_static=field(15),
+            pe_ttm=field(22),
+            pe_fundamental=field(39),
+            pb=field(16),
+            pb_fundamental=field(46),
+            dividend_per_10=field(53),
+            turnover_rate_fundamental=field(56),
+            field_count=len(data_parts),
+        )
+
+    @property
+    def pe_ratio(self) -> Optional[float]:
+        """PE按优先级：基本面PE > TTM PE > 静态PE > 动态PE"""
+        for pe_value in (self.pe_fundamental, self.pe_ttm, self.pe_static, self.pe_dynamic):
+            if pe_value is not None and 0 < pe_value < 1000:
+                return pe_value
+        return None
+
+    @property
+    def pb_ratio(self) -> Optional[float]:
+        if self.pb is not None and 0 < self.pb < 100:
+            return self.pb
+        return None
+
+    def to_realtime_dict(self) -> Dict:
+        """实时数据字段"""
+        return {
+            'code': self.code,
+            'name': self.name,
+            'price': self.price,
+            'prev_close': self.prev_close,
+            'change_pct': self.change_pct,
+            'pe_ratio': self.pe_ratio,
+            'pb_ratio': self.pb_ratio,
+            'market_cap': self.market_cap,
+            'total_shares': self.total_shares,
+            'volume': self.volume,
+            'turnover': self.turnover,
+            'turnover_rate': self.turnover_rate
+        }
+
+    def to_fundamental_dict(self) -> Dict:
+        """基本面数据字段（PB、股息率、PEG、ROE估算等），字段不足时返回空基本面"""
+        if self.field_count <= 52:
+            return empty_fundamental_dict()
+
+        # PB市净率
+        pb_ratio = self.pb_fundamental
+        if pb_ratio is not None and pb_ratio <= 0:
+            pb_ratio = None
+
+        # 股息率：优先手动配置，否则按每10股股息换算
+        dividend_yield = get_manual_dividend_yield(self.code)
+        if dividend_yield is None:
+            dividend_data = self.dividend_per_10
+            if self.price and self.price > 0 and dividend_data and dividend_data > 0:
+                dividend_yield = (dividend_data / 10) / self.price * 100
+                if not (0 < dividend_yield <= 20):
+                    dividend_yield = None
+
+        turnover_rate = self.turnover_rate_fundamental
+
+        # PE和简化PEG：PB<1假设增长20%，PB>5假设10%，否则15%
+        pe_ratio = None
+        peg = None
+        if self.pe_fundamental is not None and 0 < self.pe_fundamental < 200:
+            pe_ratio = self.pe_fundamental
+            if pb_ratio:
+                if pb_ratio < 1:
+                    assumed_growth = 20
+                elif pb_ratio > 5:
+                    assumed_growth = 10
+                else:
+                    assumed_growth = 15
+            else:
+                assumed_growth = 15
+            peg = pe_ratio / assumed_growth
+
+        # ROE = PB / PE，超出±50%视为异常
+        roe = None
+        if pb_ratio and pe_ratio:
+            roe = (pb_ratio / pe_ratio) * 100
+            if roe < -50 or roe > 50:
+                roe = None
+
+        # 利润增长率估算 = ROE × (1 - 股息支付率)
+        profit_growth = None
+        if roe and dividend_yield:
+            payout_ratio = min(dividend_yield / roe, 0.9) if roe > 0 else 0.5
+            profit_growth = roe * (1 - payout_ratio)
+
+        return {
+            'pb_ratio': pb_ratio,
+            'dividend_yield': dividend_yield,
+            'peg': peg,
+            'turnover_rate': turnover_rate,
+            'financial_health_score': calculate_financial_health(
+                pb_ratio, dividend_yield, pe_ratio, turnover_rate
+            ),
+            'roe': roe,
+            'profit_growth': profit_growth,
+            'debt_ratio': None,
+            'current_ratio': None,
+            'gross_margin': None,
+            # 不设置market_cap和total_shares为None，保留实时数据中的值
+        }
+
+
+def empty_fundamental_dict() -> Dict:
+    """基本面数据获取失败时的默认值"""
+    return {
+        'pb_ratio': None,
+        'dividend_yield': None,
+        'peg': None,
+        'turnover_rate': None,
+        'financial_health_score': 0,
+        'roe': None,
+        'profit_growth': None,
+        'debt_ratio': None,
+        'current_ratio': None,
+        'gross_margin': None,
+    }
+
+
+def calculate_financial_health(pb: Optional[float], div_yield: Optional[float],
+                               pe: Optional[float], turnover: Optional[float]) -> int:
+    """基于有限数据计算财务健康度评分 (0-100)"""
+    score = 50
+
+    if pb:
+        if pb < 1:
+            score += 20
+        elif pb < 2:
+            score += 10
+        elif pb > 10:
+            score -= 20
+        elif pb > 5:
+            score -= 10
+
+    if div_yield:
+        if div_yield > 5:
+            score += 15
+        elif div_yield > 3:
+            score += 10
+        elif div_yield > 2:
+            score += 5
+        elif div_yield < 1:
+            score -= 5
+
+    if pe:
+        if 10 < pe < 20:
+            score += 10
+        elif 20 <= pe < 30:
+            score += 5
+        elif pe >= 50:
+            score -= 10
+
+    if turnover:
+        if 1 < turnover < 5:
+            score += 5
+        elif turnover > 20:
+            score -= 5
+
+    return max(0, min(100, score))
+
+
+def parse_quote_record(stock_code: str, data_parts: List[str]) -> Optional[QuoteRecord]:
+    """解析行情记录，数据非法时返回None"""
+    try:
+        return QuoteRecord.from_parts(stock_code, data_parts)
+    except ValueError as e:
+        logger.debug(f"解析股票 {stock_code} 行情失败: {e}")
+        return None
+
+
+def parse_realtime_fields(stock_code: str, data_parts: List[str]) -> Dict:
+    """从行情字段列表解析实时数据，字段不足时返回空字典"""
+    record = QuoteRecord.from_parts(stock_code, data_parts)
+    return record.to_realtime_dict() if record else {}
+
+
+def _to_float(value: Optional[str]) -> Optional[float]:
+    """字符串转float，空串或非法值返回None"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _chunks(items: List[str], size: int) -> List[List[str]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def fetch_quotes(stock_codes: List[str], headers: Optional[Dict] = None,
+                 batch_size: int = QUOTE_BATCH_SIZE, timeout: int = 15,
+                 max_retries: int = 3) -> Dict[str, List[str]]:
+    """
+    同步批量获取行情
+
+    Args:
+        stock_codes: 股票代码列表
+        headers: 请求头
+        batch_size: 单次请求的股票数量
+        timeout: 超时时间(秒)
+        max_retries: 每批最大重试次数
+
+    Returns:
+        {股票代码: 字段列表}，获取失败的股票不在结果中
+    """
+    result = {}
+    for batch in _chunks(list(stock_codes), batch_size):
+        symbols = [to_symbol(code) for code in batch]
+        url = build_quote_url(symbols)
+
+        for attempt in range(max_retries):
+            try:
+                throttle(url)
+                response = http_get(url, headers=headers, timeout=timeout)
+                if response.status_code == 200:
+                    parsed = parse_quote_response(response.text)
+                    for code, symbol in zip(batch, symbols):
+                        if symbol in parsed:
+                            result[code] = parsed[symbol]
+                    break
+            except Exception as e:
+                logger.debug(f"批量行情请求失败 (尝试 {attempt + 1}/{max_retries}): {e}")
+
+            if attempt < max_retries - 1:
+                time.sleep((2 ** attempt) * 0.5 + random.uniform(0, 0.5))
+
+    logger.info(f"批量行情获取: {len(result)}/{len(stock_codes)} 只")
+    return result
+
+
+async def fetch_quotes_async(fetch_text: Callable[[str], Awaitable[Optional[str]]],
+                             stock_codes: List[str],
+                             batch_size: int = QUOTE_BATCH_SIZE) -> Dict[str, List[str]]:
+    """
+    异步批量获取行情，各批次并发请求
+
+    Args:
+        fetch_text: 异步请求函数，输入URL返回响应文本（失败返回None）
+        stock_codes: 股票代码列表
+        batch_size: 单次请求的股票数量
+
+    Returns:
+        {股票代码: 字段列表}，获取失败的股票不在结果中
+    """
+    batches = _chunks(list(stock_codes), batch_size)
+
+    async def _fetch_batch(batch: List[str]) -> Dict[str, List[str]]:
+        symbols = [to_symbol(code) for code in batch]
+        content = await fetch_text(build_quote_url(symbols))
+        if not content:
+            return {}
+        parsed = parse_quote_response(content)
+        return {code: parsed[symbol] for code, symbol in zip(batch, symbols) if symbol in parsed}
+
+    result = {}
+    for batch_result in await asyncio.gather(*[_fetch_batch(b) for b in batches]):
+        result.update(batch_result)
+    return result
@@ -0,0 +1,75 @@
+"""
+按主机的令牌桶限速（进程内共享）
+
+同一主机的所有HTTP调用（同步/异步、实盘/回测下载）共用一个令牌桶：
+令牌按 rate（次/秒）持续补充，最多积累 burst 个，允许短时突发；
+令牌不足时按预约的等待时间休眠，而不是在各处写固定延时。
+各主机的速率见 config.config.RATE_LIMITS，未配置的主机使用 'default'。
+"""
+import asyncio
+import threading
+import time
+from typing import Dict
+from urllib.parse import urlsplit
+
+from config.config import RATE_LIMITS
+
+
+class TokenBucket:
+    """线程安全的令牌桶，acquire（线程）与 acquire_async（协程）可混用"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """预约一个令牌，返回需要等待的秒数（令牌不足时记为欠额，后续请求顺延）"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def host_of(url: str) -> str:
+    """URL中的主机名（传入的已是主机名时原样返回）"""
+    return urlsplit(url).hostname or url
+
+
+def get_bucket(url: str) -> TokenBucket:
+    """URL或主机名对应的令牌桶（进程内单例）"""
+    host = host_of(url)
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            limits = RATE_LIMITS.get(host, RATE_LIMITS['default'])
+            bucket = _buckets[host] = TokenBucket(limits['rate'], limits['burst'])
+        return bucket
+
+
+def throttle(url: str):
+    """同步请求前调用：按主机限速，必要时阻塞等待"""
+    get_bucket(url).acquire()
+
+
+async def throttle_async(url: str):
+    """异步请求前调用：按主机限速，必要时挂起等待"""
+    await get_bucket(url).acquire_async()